@@ -0,0 +1,231 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import parse_headers
+from io import BytesIO
+from request_router import RequestRouter
+
+
+class AsyncServerControl:
+    # 请求行和请求头的最大长度（字节）
+    max_header_size = 65536
+    # 空闲连接的超时时间（秒），为空时空闲连接一直保持
+    idle_timeout = 300
+    # 操作系统监听队列的长度
+    backlog = 1024
+
+    def __init__(self, router: RequestRouter, host: str = '127.0.0.1', port: int = 8212, max_workers: int = 4,
+                 idle_timeout: float = None, max_keep_alive_requests: int = None):
+        """
+        初始化 AsyncServerControl 实例。
+        使用 asyncio 非阻塞套接字处理连接，大量空闲的长连接只占用很少的资源；
+        RequestRouter（以及其中的 DataHandler）的数据库操作在专用线程池中执行，不会阻塞事件循环。
+
+        :param router: RequestRouter 实例
+        :param host: 主机地址，默认为 '127.0.0.1'
+        :param port: 端口号，默认为 8212
+        :param max_workers: 执行数据库操作的线程数，默认为 4
+        :param idle_timeout: 空闲连接的超时时间（秒），默认为类属性 idle_timeout
+        :param max_keep_alive_requests: 每个连接最多处理的请求数，为空时不限制
+        """
+        self.router = router
+        self.host = host
+        self.port = port
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="SetWindowsTopAPI-db")
+        self.loop = None
+        self.server = None
+        self.stopped = None
+        self.ready = threading.Event()
+        self.connections = {}
+        self.pending_requests = set()
+
+    def start_server(self):
+        """
+        启动服务器，阻塞直到调用 stop_server。
+        """
+        asyncio.run(self.serve())
+
+    def stop_server(self):
+        """
+        停止服务器。可以在其他线程中调用，不再接受新的连接，等待正在处理的请求完成后关闭所有连接。
+        """
+        self.ready.wait()
+        self.router.close_streams()
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def serve(self):
+        """
+        运行服务器直到 stopped 被设置。
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 limit=self.max_header_size, backlog=self.backlog)
+        print(f"Starting asyncio server at http://{self.host}:{self.port}")
+        self.ready.set()
+
+        await self.stopped.wait()
+
+        # 不再接受新的连接，等待正在处理的请求完成，然后关闭所有连接
+        self.server.close()
+        if self.pending_requests:
+            await asyncio.gather(*self.pending_requests, return_exceptions=True)
+        for writer in list(self.connections.keys()):
+            writer.close()
+        if self.connections:
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        self.router.close_handlers()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        处理一个连接。HTTP/1.1 连接默认保持，可以连续处理多个请求。
+        """
+        self.connections[writer] = asyncio.current_task()
+        handled_requests = 0
+        try:
+            while not self.stopped.is_set():
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError):
+                    break
+
+                request_line, _, header_bytes = head.partition(b"\r\n")
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    await self.write_response(writer, *RequestRouter.json_response(400, {"error": "Bad request"}),
+                                              keep_alive=False)
+                    break
+                method, path, version = parts
+                headers = parse_headers(BytesIO(header_bytes))
+
+                try:
+                    content_length = int(headers.get('Content-Length', 0))
+                    body = await reader.readexactly(content_length) if content_length > 0 else b""
+                except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                connection_header = headers.get('Connection', '').lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection_header != "close"
+                else:
+                    keep_alive = connection_header == "keep-alive"
+
+                status, response_headers, response_body = await self.dispatch(method, path, headers, body)
+                handled_requests += 1
+                if self.max_keep_alive_requests and handled_requests >= self.max_keep_alive_requests:
+                    keep_alive = False
+                keep_alive = keep_alive and not self.stopped.is_set()
+                if isinstance(response_body, bytes):
+                    await self.write_response(writer, status, response_headers, response_body, keep_alive)
+                else:
+                    keep_alive = await self.write_streaming_response(writer, status, response_headers,
+                                                                     response_body, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def dispatch(self, method, path, headers, body):
+        """
+        在数据库线程池中调用 RequestRouter 处理请求。
+
+        :return: (状态码, 响应头字典, 响应体字节串)
+        """
+        future = self.loop.run_in_executor(self.executor, self.router.handle_request, method, path, headers, body)
+        self.pending_requests.add(future)
+        try:
+            return await future
+        except Exception as e:
+            print(f"AsyncServerControl.dispatch: Failed to handle {method} {path}: {e}")
+            return RequestRouter.json_response(500, {"error": "Internal server error"})
+        finally:
+            self.pending_requests.discard(future)
+
+    async def write_streaming_response(self, writer, status, headers, body, keep_alive=True):
+        """
+        使用分块传输编码写回流式响应。
+        支持 poll_chunk 的响应体（如 Server-Sent Events）由事件循环等待新数据，不占用线程；
+        其他可迭代对象在数据库线程池中逐段生成。
+
+        :param writer: asyncio.StreamWriter 实例
+        :param status: HTTP 状态码
+        :param headers: 响应头字典
+        :param body: 逐段产生字节串的可迭代对象
+        :param keep_alive: 是否保持连接
+        :return: 响应完成后是否可以继续保持连接
+        """
+        pollable = hasattr(body, "poll_chunk")
+        keep_alive = keep_alive and getattr(body, "keep_alive", True)
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Date: {formatdate(usegmt=True)}"]
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        lines.append("Transfer-Encoding: chunked")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+        try:
+            if pollable:
+                wakeup = asyncio.Event()
+                body.set_waker(lambda: self.loop.call_soon_threadsafe(wakeup.set))
+                while not body.finished:
+                    wakeup.clear()
+                    chunk = body.poll_chunk()
+                    if chunk is None:
+                        try:
+                            await asyncio.wait_for(wakeup.wait(), body.heartbeat_interval)
+                            continue
+                        except asyncio.TimeoutError:
+                            chunk = body.heartbeat_chunk()
+                    if chunk:
+                        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        await writer.drain()
+            else:
+                iterator = iter(body)
+                while True:
+                    chunk = await self.loop.run_in_executor(self.executor, next, iterator, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            return False
+        finally:
+            if pollable:
+                body.close()
+            elif hasattr(body, "close"):
+                # 关闭生成器时可能需要归还数据库连接，在线程池中执行
+                await self.loop.run_in_executor(self.executor, body.close)
+        return keep_alive
+
+    @staticmethod
+    async def write_response(writer, status, headers, body, keep_alive=True):
+        """
+        写回响应。
+
+        :param writer: asyncio.StreamWriter 实例
+        :param status: HTTP 状态码
+        :param headers: 响应头字典
+        :param body: 响应体字节串
+        :param keep_alive: 是否保持连接
+        """
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Date: {formatdate(usegmt=True)}"]
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
@@ -0,0 +1,216 @@
+import threading
+import uuid
+from collections import deque
+
+
+class ChangeSubscriber:
+    def __init__(self, stream: 'ChangeStream', table_name: str, buffer_size: int):
+        """
+        初始化 ChangeSubscriber 实例，表示一个订阅某个表行级变更事件的客户端。
+        每个订阅者有一个有界缓冲区，缓冲区满（客户端消费过慢）时清空缓冲区并标记为需要重新同步。
+
+        :param stream: 所属的 ChangeStream
+        :param table_name: 订阅的表名
+        :param buffer_size: 缓冲区最多保存的事件数
+        """
+        self.stream = stream
+        self.table_name = table_name
+        self.buffer_size = buffer_size
+        self.events = deque()
+        self.condition = threading.Condition()
+        self.resync = False
+        self.closed = False
+        self.waker = None
+
+    def put(self, event: dict):
+        """
+        向缓冲区添加一个事件。
+
+        :param event: 事件字典
+        """
+        with self.condition:
+            if self.closed or self.resync:
+                return
+            if len(self.events) >= self.buffer_size:
+                self.events.clear()
+                self.resync = True
+            else:
+                self.events.append(event)
+            self.condition.notify_all()
+            waker = self.waker
+        if waker:
+            waker()
+
+    def request_resync(self):
+        """
+        标记该订阅者需要重新同步，例如客户端请求恢复的事件已经不在历史记录中。
+        """
+        with self.condition:
+            self.events.clear()
+            self.resync = True
+            self.condition.notify_all()
+
+    def poll(self):
+        """
+        取出缓冲区中的所有事件，不阻塞。
+
+        :return: (事件列表, 是否需要重新同步)
+        """
+        with self.condition:
+            events = list(self.events)
+            self.events.clear()
+            return events, self.resync
+
+    def wait(self, timeout=None):
+        """
+        等待直到缓冲区中有事件、需要重新同步、订阅被关闭或者超时，然后取出所有事件。
+
+        :param timeout: 最长等待时间（秒）
+        :return: (事件列表, 是否需要重新同步)
+        """
+        with self.condition:
+            if not self.events and not self.resync and not self.closed:
+                self.condition.wait(timeout)
+        return self.poll()
+
+    def set_waker(self, waker):
+        """
+        设置有新事件时调用的回调函数，供不能阻塞等待的调用方（如 asyncio 事件循环）使用。
+
+        :param waker: 无参数的回调函数，会在写入数据的线程中被调用
+        """
+        with self.condition:
+            self.waker = waker
+
+    def close(self):
+        """
+        取消订阅。
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            waker = self.waker
+        self.stream.unsubscribe(self)
+        if waker:
+            waker()
+
+
+class ChangeStream:
+    def __init__(self, history_size: int = 1000, subscriber_buffer_size: int = 256):
+        """
+        初始化 ChangeStream 实例，向订阅者推送各表的行级变更事件（insert、update、delete）。
+        每个事件有一个单调递增的 ID，最近的事件保存在历史记录中，重新连接的客户端可以根据上次收到的事件 ID 补收错过的事件。
+
+        :param history_size: 每个表保存的历史事件数
+        :param subscriber_buffer_size: 每个订阅者缓冲区最多保存的事件数
+        """
+        self.history_size = history_size
+        self.subscriber_buffer_size = subscriber_buffer_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+        self.last_event_number = 0
+        self.history = {}
+        self.subscribers = {}
+
+    def is_active(self, table_name: str) -> bool:
+        """
+        检查指定表是否曾经被订阅。只有被订阅过的表才需要记录行级事件，
+        此后即使暂时没有订阅者也继续记录，以便重新连接的客户端补收事件。
+
+        :param table_name: 表名
+        :return: 被订阅过时返回 True
+        """
+        return table_name in self.history
+
+    def format_event_id(self, event_number: int) -> str:
+        """
+        生成事件 ID，包括进程标识，重启前的事件 ID 不会被误认为当前进程的事件。
+
+        :param event_number: 事件序号
+        :return: 事件 ID
+        """
+        return f"{self.epoch}-{event_number}"
+
+    def parse_event_id(self, event_id: str):
+        """
+        解析事件 ID。
+
+        :param event_id: 事件 ID
+        :return: 事件序号，不是当前进程的事件 ID 时返回 None
+        """
+        epoch, _, event_number = (event_id or "").partition("-")
+        if epoch != self.epoch or not event_number.isdigit():
+            return None
+        return int(event_number)
+
+    def publish(self, table_name: str, operation: str, rows: list):
+        """
+        发布行级变更事件。
+
+        :param table_name: 表名
+        :param operation: 操作类型，insert、update 或 delete
+        :param rows: 发生变化的行（字典）列表，update 和 insert 为变化后的行，delete 为被删除的行
+        """
+        # 在分配事件 ID 的锁内放入订阅者的缓冲区，并发发布的事件按 ID 的顺序到达，
+        # 否则客户端可能先收到较大的 ID，之后用 Last-Event-ID 恢复时漏掉较小的那个事件
+        with self.lock:
+            history = self.history.get(table_name)
+            if history is None:
+                return
+            subscribers = self.subscribers.get(table_name, ())
+            for row in rows:
+                self.last_event_number += 1
+                event = {
+                    "number": self.last_event_number,
+                    "id": self.format_event_id(self.last_event_number),
+                    "table": table_name,
+                    "operation": operation,
+                    "row": row,
+                }
+                history.append(event)
+                for subscriber in subscribers:
+                    subscriber.put(event)
+
+    def subscribe(self, table_name: str, last_event_id: str = None) -> ChangeSubscriber:
+        """
+        订阅指定表的变更事件。
+
+        :param table_name: 表名
+        :param last_event_id: 客户端上次收到的事件 ID，不为空时先补发此后的历史事件；
+                              历史记录中已经没有需要的事件时，订阅者会收到重新同步的通知
+        :return: ChangeSubscriber 实例
+        """
+        subscriber = ChangeSubscriber(self, table_name, self.subscriber_buffer_size)
+        with self.lock:
+            history = self.history.setdefault(table_name, deque(maxlen=self.history_size))
+            self.subscribers.setdefault(table_name, set()).add(subscriber)
+
+            if last_event_id:
+                last_event_number = self.parse_event_id(last_event_id)
+                oldest_event_number = history[0]["number"] if history else self.last_event_number + 1
+                if last_event_number is None or last_event_number + 1 < oldest_event_number:
+                    subscriber.request_resync()
+                else:
+                    for event in history:
+                        if event["number"] > last_event_number:
+                            subscriber.put(event)
+        return subscriber
+
+    def unsubscribe(self, subscriber: ChangeSubscriber):
+        """
+        移除订阅者。
+
+        :param subscriber: ChangeSubscriber 实例
+        """
+        with self.lock:
+            self.subscribers.get(subscriber.table_name, set()).discard(subscriber)
+
+    def close_all_subscribers(self):
+        """
+        关闭所有订阅，例如服务器停止时。
+        """
+        with self.lock:
+            subscribers = [subscriber for table_subscribers in self.subscribers.values()
+                           for subscriber in table_subscribers]
+        for subscriber in subscribers:
+            subscriber.close()
@@ -1,52 +1,455 @@
+import atexit
+import base64
+import binascii
 import json
+import sqlite3
+import threading
+import time
+import tracemalloc
+import zlib
 from data_models import DataModel, CurrentWindows, AllWindows
 from database import Database
+from model_cache import ModelCache
+
+try:
+    # 可选依赖，安装后用于更快地生成 JSON
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class NotesWriteBuffer:
+    def __init__(self, model: 'DataModel', column: str = "notes", flush_interval: float = 2.0,
+                 flush_size: int = 100):
+        """
+        初始化 NotesWriteBuffer 实例，延迟写入模型表的某一列（默认为 notes）。
+        同一行（同一个条件列和条件值）的多次写入合并为最后一次的值，由后台线程在第一次写入 flush_interval 秒后、
+        或者等待写入的行数达到 flush_size 时在一个事务中批量写入，进程退出前会写入所有等待的值。
+
+        :param model: DataModel 实例
+        :param column: 延迟写入的列名
+        :param flush_interval: 第一次写入后最多等待的时间（秒）
+        :param flush_size: 等待写入的行数达到该值时立即写入
+        """
+        self.model = model
+        self.column = column
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.condition = threading.Condition()
+        # 同一时间只有一次写入，保证较早的值不会覆盖较新的值
+        self.flush_lock = threading.Lock()
+        # 键为 (条件列名, 条件值)，值为 (写入序号, 列的值)，按最后一次写入的顺序排列
+        self.pending = {}
+        # 正在写入数据库的值，写入完成前读取时仍然需要看到
+        self.flushing = {}
+        self.sequence = 0
+        self.first_pending_time = None
+        self.thread = None
+        self.closed = False
+
+        # 运行统计
+        self.writes = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    def put(self, condition_column, condition_value, value):
+        """
+        添加一次写入。
+
+        :param condition_column: 条件列名，必须是模型的 key_columns 之一
+        :param condition_value: 条件值
+        :param value: 列的新值
+        """
+        with self.condition:
+            key = (condition_column, condition_value)
+            self.pending.pop(key, None)
+            self.sequence += 1
+            self.pending[key] = (self.sequence, value)
+            self.writes += 1
+            if self.first_pending_time is None:
+                self.first_pending_time = time.monotonic()
+            closed = self.closed
+            if not closed and self.thread is None:
+                self.thread = threading.Thread(target=self.run, name=f"NotesWriteBuffer-{self.model.model_name}",
+                                               daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+            if len(self.pending) >= self.flush_size:
+                self.condition.notify_all()
+        if closed:
+            self.flush()
+
+    def run(self):
+        """
+        后台线程，等待写入条件满足后写入数据库，直到调用 close。
+        """
+        while True:
+            with self.condition:
+                while not self.closed:
+                    if not self.pending:
+                        self.condition.wait()
+                        continue
+                    remaining = self.first_pending_time + self.flush_interval - time.monotonic()
+                    if remaining <= 0 or len(self.pending) >= self.flush_size:
+                        break
+                    self.condition.wait(remaining)
+                if self.closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """
+        在一个事务中写入所有等待的值，写入失败的值会放回等待队列。
+
+        :return: 写入的行数
+        """
+        with self.flush_lock:
+            with self.condition:
+                if not self.pending:
+                    return 0
+                self.flushing = self.pending
+                self.pending = {}
+                self.first_pending_time = None
+            operations = [{"op": "update", column: condition_value, "set": {self.column: value}}
+                          for (column, condition_value), (_, value) in self.flushing.items()]
+            failed_keys = []
+            try:
+                committed, results = self.model.apply_model_batch(operations)
+                if not committed:
+                    # 有操作无效时整批被撤销，逐个重新写入其余的操作
+                    for key, operation, result in zip(self.flushing, operations, results):
+                        if result["status"] == "error":
+                            print(f"NotesWriteBuffer.flush: Failed to write {key}: {result['error']}")
+                        else:
+                            self.model.apply_model_batch([operation])
+            except sqlite3.Error as e:
+                print(f"NotesWriteBuffer.flush: Failed to write table '{self.model.model_name}': {e}")
+                failed_keys = list(self.flushing)
+            with self.condition:
+                # 写入期间没有被再次修改的值放回等待队列，下次重试
+                for key in failed_keys:
+                    if key not in self.pending:
+                        self.pending[key] = self.flushing[key]
+                if self.pending and self.first_pending_time is None:
+                    self.first_pending_time = time.monotonic()
+                flushed_count = len(self.flushing) - len(failed_keys)
+                self.flushing = {}
+                self.flushes += 1
+                self.flushed_rows += flushed_count
+            return flushed_count
+
+    def get_pending_token(self):
+        """
+        获取表示等待写入状态的标识，用于生成 ETag。
+
+        :return: 有等待写入的值时返回最后一次写入的序号，否则返回 None
+        """
+        with self.condition:
+            return self.sequence if self.pending or self.flushing else None
+
+    def overlay(self, rows):
+        """
+        把等待写入的值应用到从模型表读取的行上，使读取结果与写入后一致。
+
+        :param rows: 行字典、行字典列表或 None，会被直接修改
+        :return: rows
+        """
+        with self.condition:
+            entries = list(self.flushing.items()) + list(self.pending.items())
+        if not entries or not rows:
+            return rows
+        # 每个条件列的值对应的 (写入序号, 列的值)，同一行被多个条件匹配时使用最后一次写入的值
+        lookup = {}
+        for (column, condition_value), entry in entries:
+            lookup.setdefault(column, {})[ModelCache.normalize(condition_value)] = entry
+        for row in rows if isinstance(rows, list) else [rows]:
+            if self.column not in row:
+                continue
+            matches = [lookup[column].get(ModelCache.normalize(row[column])) for column in lookup if column in row]
+            matches = [entry for entry in matches if entry is not None]
+            if matches:
+                row[self.column] = max(matches)[1]
+        return rows
+
+    def close(self):
+        """
+        停止后台线程并写入所有等待的值，可以重复调用。
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def get_stats(self):
+        """
+        获取运行统计。
+
+        :return: 包含写入次数、实际写入的行数、批量写入次数和等待写入的行数的字典
+        """
+        with self.condition:
+            return {
+                "writes": self.writes,
+                "flushed_rows": self.flushed_rows,
+                "flushes": self.flushes,
+                "pending": len(self.pending) + len(self.flushing),
+            }
 
 
 class DataHandler:
-    def __init__(self, model: 'DataModel'):
+    # 分页时每页最多返回的行数
+    max_page_size = 1000
+    # 全文搜索时每页默认返回的行数
+    search_page_size = 20
+    # 一次批量请求最多包含的操作数
+    max_batch_size = 1000
+    # 延迟写入笔记时第一次写入后最多等待的时间（秒）和立即写入的行数
+    notes_flush_interval = 2.0
+    notes_flush_size = 100
+
+    def __init__(self, model: 'DataModel', write_behind: bool = False):
         """
         初始化 DataHandler 实例。
         url将自动被设置为'/{model.model_name}'
 
         :param model: DataModel 实例
+        :param write_behind: 是否延迟写入只修改 notes 的更新请求，同一行的连续修改会合并为一次写入
         """
         self.model = model
         self.url = f'/{model.model_name}'
+        self.notes_buffer = NotesWriteBuffer(model, "notes", self.notes_flush_interval,
+                                             self.notes_flush_size) if write_behind else None
+
+    @staticmethod
+    def to_json(data) -> str:
+        """
+        把数据序列化为紧凑的 JSON 字符串（不缩进、不转义非 ASCII 字符）。安装了 orjson 时使用 orjson。
+
+        :param data: 可以被序列化为 JSON 的对象
+        :return: JSON 字符串
+        """
+        if orjson is not None:
+            try:
+                return orjson.dumps(data).decode()
+            except TypeError:
+                # orjson 不支持的类型（如超过 64 位的整数）交给标准库处理
+                pass
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def get_etag(self, query_dict: dict = None) -> str:
+        """
+        根据模型表的版本号生成 ETag。模型表没有变化时 ETag 保持不变。
+
+        :param query_dict: 查询条件，详细查询时不同的查询条件对应不同的 ETag
+        :return: ETag 字符串（包括双引号）
+        """
+        etag = f"{self.model.model_name}-{self.model.get_version()}"
+        pending_token = self.notes_buffer.get_pending_token() if self.notes_buffer is not None else None
+        if pending_token is not None:
+            etag += f"-p{pending_token}"
+        if query_dict:
+            query_hash = zlib.crc32(json.dumps(query_dict, sort_keys=True, ensure_ascii=False).encode())
+            etag += f"-{query_hash:08x}"
+        return f'"{etag}"'
+
+    def overlay_pending(self, rows):
+        """
+        把等待延迟写入的笔记应用到读取结果上。
+
+        :param rows: 行字典、行字典列表或 None
+        :return: rows
+        """
+        return self.notes_buffer.overlay(rows) if self.notes_buffer is not None else rows
+
+    def flush_pending(self):
+        """
+        立即写入所有等待延迟写入的笔记，在其他写入之前调用，保证较早的笔记不会覆盖之后的修改。
+        """
+        if self.notes_buffer is not None:
+            self.notes_buffer.flush()
+
+    def close(self):
+        """
+        写入所有等待延迟写入的笔记并停止后台线程，服务器停止时调用。
+        """
+        if self.notes_buffer is not None:
+            self.notes_buffer.close()
 
-    def get_model_list_json(self) -> str:
+    def get_table_stats(self) -> dict:
+        """
+        获取模型表的统计信息（行数、占用的字节数等），由数据库统计，不读取行。
+
+        :return: 统计信息字典
+        """
+        return self.model.get_table_stats()
+
+    def subscribe_changes(self, last_event_id: str = None):
+        """
+        订阅模型表的行级变更事件。
+
+        :param last_event_id: 客户端上次收到的事件 ID，不为空时先补发此后错过的事件
+        :return: ChangeSubscriber 实例
+        """
+        return self.model.change_stream.subscribe(self.model.model_name, last_event_id)
+
+    def get_model_list_json(self, use_cache: bool = True) -> str:
         """
         获取由 DataModel 转化成的 JSON 字符串。
 
+        :param use_cache: 是否使用模型表的缓存，为 False 时直接读取数据库
         :return: JSON 字符串
         """
-        data = self.model.get_model_list()
-        return json.dumps(data, ensure_ascii=False, indent=4)
+        data = self.overlay_pending(self.model.get_model_list(use_cache))
+        return self.to_json(data)
+
+    @staticmethod
+    def encode_cursor(order_by: str, descending: bool, after) -> str:
+        """
+        把游标编码为不透明的字符串，其中包括排序方式，防止用于不同排序方式的分页。
+
+        :param order_by: 排序列名
+        :param descending: 是否降序
+        :param after: 游标，最后一行的 (order_by 列的值, id)
+        :return: 游标字符串
+        """
+        data = json.dumps([order_by, descending, after[0], after[1]], ensure_ascii=False)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, order_by: str, descending: bool):
+        """
+        解码游标字符串。
+
+        :param cursor: 游标字符串
+        :param order_by: 当前请求的排序列名
+        :param descending: 当前请求是否降序
+        :return: (order_by 列的值, id)；游标无效或与当前排序方式不符时抛出 ValueError
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            cursor_order_by, cursor_descending, order_value, row_id = data
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if cursor_order_by != order_by or cursor_descending != descending:
+            raise ValueError("Cursor does not match order_by")
+        return order_value, row_id
+
+    def iter_model_list_json(self, batch_size: int = 500, use_cache: bool = True):
+        """
+        逐段生成与 get_model_list_json 相同的 JSON，每段包含一批行，内存占用与表的大小无关。
+
+        :param batch_size: 每段包含的行数
+        :param use_cache: 是否使用模型表的缓存，为 False 时直接读取数据库
+        :return: 生成器，每次产生一段 JSON 字节串
+        """
+        batches = self.model.iter_model_batches(batch_size, use_cache)
+        try:
+            first_batch = next(batches, None)
+            if not first_batch:
+                print(f"DataModel.get_model_list: No valid data or columns for table '{self.model.model_name}'")
+                yield b"null"
+                return
+            next_batch = next(batches, None)
+            # 与 get_model_list 一致：只有一行时返回该行的字典
+            if len(first_batch) == 1 and not next_batch:
+                yield self.to_json(self.overlay_pending(first_batch[0])).encode()
+                return
+
+            yield b"[" + self.to_json(self.overlay_pending(first_batch))[1:-1].encode()
+            while next_batch:
+                yield b"," + self.to_json(self.overlay_pending(next_batch))[1:-1].encode()
+                next_batch = next(batches, None)
+            yield b"]"
+        finally:
+            batches.close()
+
+    def get_model_page_json(self, fields=None, limit=None, order_by=None, cursor=None, after_id=None) -> str:
+        """
+        分页获取模型表，返回包含本页数据和下一页游标的 JSON 字符串。
+
+        :param fields: 需要返回的列名列表，为空时返回所有列
+        :param limit: 每页最多返回的行数，不超过 max_page_size
+        :param order_by: 排序列名，以 "-" 开头时降序，默认为 id
+        :param cursor: 上一页响应中的 next_cursor
+        :param after_id: 从 id 为该值的行之后开始，有 cursor 时忽略
+        :return: JSON 字符串，{"items": [...], "next_cursor": 游标字符串或 null}；参数无效时抛出 ValueError
+        """
+        order_by = order_by or "id"
+        descending = order_by.startswith("-")
+        order_column = order_by.lstrip("-")
+        limit = min(limit, self.max_page_size) if limit is not None else self.max_page_size
+        after = self.decode_cursor(cursor, order_column, descending) if cursor else None
+
+        # 按笔记排序时需要数据库中的笔记是最新的
+        if order_column == "notes":
+            self.flush_pending()
+        # 等待写入的笔记按 key_columns 匹配行，只选择部分列时也要读取这些列，应用后再去掉
+        query_fields = fields
+        extra_columns = []
+        if fields and self.notes_buffer is not None and self.notes_buffer.column in fields:
+            extra_columns = [col for col in self.model.key_columns if col not in fields]
+            query_fields = list(fields) + extra_columns
+        rows, next_after = self.model.get_model_page(query_fields, limit, order_column, descending, after, after_id)
+        self.overlay_pending(rows)
+        for row in rows if extra_columns else []:
+            for col in extra_columns:
+                del row[col]
+        next_cursor = self.encode_cursor(order_column, descending, next_after) if next_after else None
+        return self.to_json({"items": rows, "next_cursor": next_cursor})
 
-    def get_model_from_json(self, json_data: str) -> str:
+    def search_model_json(self, text: str, limit=None, cursor=None) -> str:
+        """
+        全文搜索模型表，返回包含本页结果和下一页游标的 JSON 字符串。
+
+        :param text: 搜索文本
+        :param limit: 每页最多返回的行数，默认为 search_page_size，不超过 max_page_size
+        :param cursor: 上一页响应中的 next_cursor，必须与本次使用相同的搜索文本
+        :return: JSON 字符串，{"items": [...], "next_cursor": 游标字符串或 null}；参数无效时抛出 ValueError
+        """
+        if not text or not text.strip():
+            raise ValueError("q must not be empty")
+        limit = min(limit, self.max_page_size) if limit is not None else self.search_page_size
+        offset = 0
+        if cursor:
+            cursor_text, offset = self.decode_cursor(cursor, "search", False)
+            if cursor_text != text or not isinstance(offset, int) or offset < 0:
+                raise ValueError("Cursor does not match q")
+
+        # 索引由数据库维护，搜索前写入等待的笔记
+        self.flush_pending()
+        rows, next_offset = self.model.search_model(text, limit, offset)
+        next_cursor = self.encode_cursor("search", False, (text, next_offset)) if next_offset is not None else None
+        return self.to_json({"items": rows, "next_cursor": next_cursor})
+
+    def get_model_from_json(self, json_data: str, use_cache: bool = True) -> str:
         """
         根据 JSON 数据查询模型表，并返回结果的 JSON 字符串。
         只要该行的所有列参数中有一个参数符合查询条件中的一个参数，就返回该行。
 
         :param json_data: JSON 字符串
+        :param use_cache: 是否使用模型表的缓存，为 False 时直接读取数据库
         :return: 查询结果的 JSON 字符串
         """
         query_dict = json.loads(json_data)
-        result = self.model.get_model(query_dict)
+        # 以笔记为查询条件时需要数据库中的笔记是最新的
+        if "notes" in query_dict:
+            self.flush_pending()
+        result = self.overlay_pending(self.model.get_model(query_dict, use_cache))
 
         if not result:  # 检查结果是否为空
-            return json.dumps({"error": "No matching records found"}, ensure_ascii=False, indent=4)
+            return self.to_json({"error": "No matching records found"})
 
-        if isinstance(result, list):
-            return json.dumps(result, ensure_ascii=False, indent=4)
-        return json.dumps(result, ensure_ascii=False, indent=4)
+        return self.to_json(result)
 
     def update_model_from_json(self, json_data: str, condition: str):
         """
-        根据 JSON 数据更新模型表。
+        根据 JSON 数据更新模型表。启用了延迟写入时，只修改 notes 的请求先放入等待队列。
 
         :param json_data: JSON 字符串
         :param condition: 条件列名
+        :return: 延迟写入时返回 True
         """
         data_dict = json.loads(json_data)
         condition_value = data_dict.get(condition)
@@ -58,31 +461,56 @@ class DataHandler:
         set_dict = {column: value for column, value in data_dict.items() if column != condition}
         condition_dict = {condition: condition_value}
 
+        # 只修改笔记的请求延迟写入
+        if self.notes_buffer is not None and list(set_dict) == ["notes"] and condition in self.model.key_columns:
+            self.notes_buffer.put(condition, condition_value, set_dict["notes"])
+            return True
+
         # 更新模型表
+        self.flush_pending()
         self.model.update_model_row(set_dict, condition_dict)
+        return False
+
+    def apply_batch(self, operations: list) -> dict:
+        """
+        在一个事务中执行一组操作，任意一个操作失败时所有操作都不会生效。
+
+        :param operations: 操作字典列表，格式见 DataModel.apply_model_batch
+        :return: {"committed": 是否已提交, "results": 每个操作的结果列表}；操作数超过 max_batch_size 时抛出 ValueError
+        """
+        if len(operations) > self.max_batch_size:
+            raise ValueError(f"Batch contains more than {self.max_batch_size} operations")
+        self.flush_pending()
+        committed, results = self.model.apply_model_batch(operations)
+        return {"committed": committed, "results": [{"index": index, **result} for index, result in enumerate(results)]}
 
     def toggle_is_set_top(self, condition: str, condition_value: str):
         """
-        根据条件切换 is_set_top 字段的值。
+        根据条件切换 is_set_top 字段的值，切换和取回切换后的行在一条语句中完成。
 
         :param condition: 条件列名
         :param condition_value: 条件值
+        :return: 切换后的行字典（多行匹配时为字典列表），没有匹配的行时返回包含 error 的字典
         """
-        data = self.model.get_model({condition: condition_value})
-        if not data:
+        rows = self.model.toggle_model_row({condition: condition_value})
+        if not rows:
             return {"error": "No matching records found"}
+        return self.overlay_pending(rows[0] if len(rows) == 1 else rows)
 
-        if isinstance(data, list):
-            data = data[0]
-
-        current_value = data.get("is_set_top")
-        new_value = 0 if current_value else 1
-
-        set_dict = {"is_set_top": new_value}
-        condition_dict = {condition: condition_value}
+    def set_top_all(self, action: str) -> dict:
+        """
+        暂停或继续所有窗口的置顶。
 
-        self.model.update_model_row(set_dict, condition_dict)
-        return self.model.get_model(condition_dict)
+        :param action: unpin 取消所有窗口的置顶并记住这些窗口，repin 恢复之前被取消的窗口的置顶
+        :return: {"updated": 被修改的行数, "rows": 被修改的行列表}；action 无效时抛出 ValueError
+        """
+        if action == "unpin":
+            rows = self.model.unpin_all()
+        elif action == "repin":
+            rows = self.model.repin_all()
+        else:
+            raise ValueError("action must be 'unpin' or 'repin'")
+        return {"updated": len(rows), "rows": self.overlay_pending(rows)}
 
 
 # 测试
@@ -141,4 +569,81 @@ if __name__ == '__main__':
     print("\nSearch Result JSON:")
     print(search_result_json)
 
+    # 多个线程同时切换同一个窗口的置顶状态：每次切换在一条语句中完成，切换次数为偶数时回到原来的状态
+    def toggle_repeatedly():
+        for _ in range(50):
+            dict_list_handler.toggle_is_set_top("hwnd", "1234")
+
+    is_set_top = windows.get_model({"hwnd": "1234"}, use_cache=False)["is_set_top"]
+    toggle_threads = [threading.Thread(target=toggle_repeatedly) for _ in range(8)]
+    for thread in toggle_threads:
+        thread.start()
+    for thread in toggle_threads:
+        thread.join()
+    assert windows.get_model({"hwnd": "1234"}, use_cache=False)["is_set_top"] == is_set_top
+    assert windows.get_model({"hwnd": "1234"})["is_set_top"] == is_set_top
+    assert dict_list_handler.toggle_is_set_top("hwnd", "1234")["is_set_top"] != is_set_top
+
+    # 暂停后继续置顶只恢复暂停前被置顶的窗口
+    windows.update_model_row({"is_set_top": None}, {"hwnd": "123456"})
+    paused = dict_list_handler.set_top_all("unpin")
+    assert [row["hwnd"] for row in paused["rows"]] == ["1234"], paused
+    resumed = dict_list_handler.set_top_all("repin")
+    assert [row["hwnd"] for row in resumed["rows"]] == ["1234"], resumed
+    print("\nToggle and pause/resume checks passed")
+
+    # 只选择部分列时，等待写入的笔记也要应用到结果上，并且不返回没有请求的列
+    buffered_handler = DataHandler(windows, write_behind=True)
+    buffered_handler.notes_buffer.flush_interval = 60
+    buffered_handler.update_model_from_json(json.dumps({"hwnd": "1234", "notes": "pending notes"}), "hwnd")
+    page = json.loads(buffered_handler.get_model_page_json(fields=["notes"]))
+    assert page["items"] == [{"notes": "updated notes for window1"}, {"notes": "pending notes"}], page
+    buffered_handler.close()
+    assert windows.get_model({"hwnd": "1234"}, use_cache=False)["notes"] == "pending notes"
+    print("\nPending notes overlay checks passed")
+
+    # 逐段生成的 JSON 与一次生成的 JSON 相同，包括多批、只有一行和没有行的情况
+    def check_streamed_list(expected_chunks):
+        for use_cache in (True, False):
+            expected = dict_list_handler.get_model_list_json(use_cache)
+            for batch_size in (1, 2, 500):
+                chunks = list(dict_list_handler.iter_model_list_json(batch_size, use_cache))
+                assert b"".join(chunks).decode() == expected, (batch_size, use_cache, chunks)
+            assert len(list(dict_list_handler.iter_model_list_json(1, use_cache))) == expected_chunks
+
+    check_streamed_list(3)
+    # 逐段读取内存中的表时不持有读锁，读取期间可以写入；提前关闭生成器时归还数据库连接
+    windows.add_model_row([{"name": f"window{i}", "hwnd": f"9{i}", "is_set_top": False, "notes": ""} for i in range(5)])
+    batches = dict_list_handler.iter_model_list_json(1, use_cache=False)
+    next(batches)
+    start = time.perf_counter()
+    windows.update_model_row({"notes": "written while streaming"}, {"hwnd": "1234"})
+    assert time.perf_counter() - start < 1
+    batches.close()
+    for i in range(5):
+        windows.delete_model_row("hwnd", f"9{i}")
+    windows.delete_model_row("hwnd", "123456")
+    check_streamed_list(1)
     windows.delete_all_rows()
+    check_streamed_list(1)
+    print("\nStreamed list checks passed")
+
+    # 逐段生成大列表时内存峰值与表的大小无关，并且远小于一次生成的 JSON
+    all_windows = AllWindows()
+    all_windows.create_model_table()
+    all_windows.delete_all_rows()
+    all_windows_handler = DataHandler(all_windows)
+    streamed_peaks = []
+    for row_count in (10000, 20000):
+        all_windows.add_model_row([{"name": f"window {i}", "notes": "notes " * 10}
+                                   for i in range(row_count - all_windows.count_models())])
+        buffered_size = len(all_windows_handler.get_model_list_json().encode())
+        tracemalloc.start()
+        streamed_size = sum(len(chunk) for chunk in all_windows_handler.iter_model_list_json())
+        streamed_peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert streamed_size == buffered_size
+    assert streamed_peaks[1] < buffered_size / 2, (streamed_peaks, buffered_size)
+    assert streamed_peaks[1] < streamed_peaks[0] * 1.5, streamed_peaks
+    all_windows.delete_all_rows()
+    print(f"\nStreamed list peak memory: {streamed_peaks[1]} bytes for a {buffered_size} byte list")
@@ -1,10 +1,112 @@
+import contextlib
+import sqlite3
+import threading
+import uuid
+from change_stream import ChangeStream
 from database import Database
 from datetime import datetime
+from model_cache import ModelCache
+
+
+class ChangeNotifier:
+    def __init__(self):
+        """
+        初始化模型变更通知器。
+        每次通过 DataModel 写入数据时全局版本号自增，并记录每个表、每一列最后一次变化时的版本号，
+        等待变化的线程会被唤醒。
+        版本号只在当前进程内单调递增，epoch 用于区分不同进程（例如重启前后）产生的版本号。
+        """
+        self.epoch = uuid.uuid4().hex[:8]
+        self.condition = threading.Condition()
+        self.version = 0
+        self.table_versions = {}
+        self.column_versions = {}
+
+    def notify(self, table_name, columns=None):
+        """
+        记录一次表数据变化并唤醒等待的线程。
+
+        :param table_name: 发生变化的表名
+        :param columns: 发生变化的列名列表，为空时表示整行变化（添加或删除行）
+        """
+        with self.condition:
+            self.version += 1
+            self.table_versions[table_name] = self.version
+            for column in columns or ("*",):
+                self.column_versions[(table_name, column)] = self.version
+            self.condition.notify_all()
+
+    def wake(self):
+        """
+        在没有数据变化的情况下唤醒所有等待的线程，例如需要停止等待的线程时。
+        """
+        with self.condition:
+            self.condition.notify_all()
+
+    def get_table_version(self, table_name):
+        """
+        获取指定表最后一次变化时的版本号。
+
+        :param table_name: 表名
+        :return: 版本号，从未变化时为 0
+        """
+        with self.condition:
+            return self.table_versions.get(table_name, 0)
+
+    def get_column_version(self, table_name, column):
+        """
+        获取指定列最后一次变化时的版本号，整行变化同样视为该列变化。
+
+        :param table_name: 表名
+        :param column: 列名
+        :return: 版本号，从未变化时为 0
+        """
+        with self.condition:
+            return max(self.column_versions.get((table_name, column), 0),
+                       self.column_versions.get((table_name, "*"), 0))
+
+    def wait_for_change(self, last_version, timeout=None):
+        """
+        等待直到全局版本号大于 last_version，或者超时，或者被 wake 唤醒。
+
+        :param last_version: 调用方已经处理过的版本号
+        :param timeout: 最长等待时间（秒），为空时一直等待
+        :return: 当前的全局版本号
+        """
+        with self.condition:
+            if self.version <= last_version:
+                self.condition.wait(timeout)
+            return self.version
 
 
 class DataModel:
     # 默认模型名称
     model_name = "DataModel"
+    # 模型表所在的数据库，所有模型共享该数据库的连接池
+    database_name = "db.sqlite3"
+    # 所有模型共享的变更通知器，写入数据后通知后端自动控制等等待数据变化的线程
+    change_notifier = ChangeNotifier()
+    # 所有模型共享的行级变更事件流，供客户端订阅
+    change_stream = ChangeStream()
+    # 模型表的普通索引，每个元素为一个索引包含的列名元组，如 ("name",) 或复合索引 ("id", "name")
+    indexes = ()
+    # 模型表的唯一索引，格式同 indexes
+    unique_indexes = ()
+    # 建立 FTS5 全文索引（索引表为 <表名>_fts）的文本列，为空时模型表不支持全文搜索
+    fulltext_columns = ()
+    # 建立 trigram 子字符串索引（索引表为 <表名>_trigram）的文本列，用于加速“包含子字符串”的查询和删除
+    substring_columns = ()
+    # 批量操作中用来定位行的列
+    key_columns = ("id",)
+    # 批量操作中 toggle 取反的布尔列，为空时不支持 toggle
+    toggle_column = None
+    # 每个表被 unpin_all 取消的行，键为表名，值为 key_columns[0] 的值集合，由 repin_all 恢复
+    unpinned_keys = {}
+    unpinned_lock = threading.Lock()
+    # 是否在内存中缓存模型表，启用后读取优先使用缓存，写入时同步更新缓存（按 id 和 key_columns 建立索引）
+    cache_enabled = False
+    # 模型表的存储方式：disk 存放在数据库文件中；memory 存放在进程内的内存数据库中，写入不访问磁盘，进程退出后数据不保留
+    storage = "disk"
 
     def __init__(self, model_table_name, **columns):
         """
@@ -27,73 +129,355 @@ class DataModel:
         """
         self.model_name = model_table_name
         self.columns = columns
+        self.cache = ModelCache.get_cache(self.database_name, self.model_name,
+                                          self.key_columns) if self.cache_enabled else None
 
     def create_model_table(self):
-        database = Database("db.sqlite3")
-        database.create_table(self.model_name, **self.columns)
+        """
+        创建模型表，并建立子类声明的索引。索引已存在时不会重复创建。
+        建立唯一索引前会删除旧数据中在索引列上重复的行（每组保留最早的一行）。
+        """
+        database = Database(self.database_name)
+        database.create_table(self.model_name, self.storage, **self.columns)
+        for index_columns in self.unique_indexes:
+            database.delete_duplicate_rows(self.model_name, list(index_columns))
+            database.create_index(self.model_name, list(index_columns), unique=True, storage=self.storage)
+        for index_columns in self.indexes:
+            database.create_index(self.model_name, list(index_columns), storage=self.storage)
+        if self.fulltext_columns:
+            database.create_fulltext_index(self.model_name, self.fulltext_columns, storage=self.storage)
+        if self.substring_columns:
+            # 子字符串索引只用于 LIKE，不需要词的位置和每列的长度，不保存这些信息可以减少写入
+            database.create_fulltext_index(self.model_name, self.substring_columns, f"{self.model_name}_trigram",
+                                           tokenizer="trigram", storage=self.storage,
+                                           options="detail=none, columnsize=0")
         database.close_connection()
+        # 删除重复行等操作没有经过写穿，重新从数据库加载缓存
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def needs_changed_rows(self):
+        """
+        检查写入时是否需要取回发生变化的行：模型表启用了缓存或者被订阅过时需要。
+
+        :return: 需要时返回 True
+        """
+        return self.cache is not None or self.change_stream.is_active(self.model_name)
+
+    def writing(self):
+        """
+        获取写入模型表时使用的上下文管理器。启用缓存时，写入数据库和更新缓存在同一个锁中完成，
+        保证缓存按照与数据库相同的顺序应用修改。
+
+        :return: 上下文管理器
+        """
+        return self.cache.write_lock if self.cache is not None else contextlib.nullcontext()
+
+    def publish_change(self, operation, rows=None, columns=None):
+        """
+        记录一次对模型表的写入：更新缓存，通知等待数据变化的线程，并在模型表被订阅过时发布行级变更事件。
 
-    def get_model_list(self):
+        :param operation: 操作类型，insert、update 或 delete
+        :param rows: 发生变化的行（字典）列表，不需要取回变化的行时为空
+        :param columns: update 时被更新的列名列表
+        """
+        if self.cache is not None:
+            self.cache.apply(operation, rows, columns)
+        self.change_notifier.notify(self.model_name, columns if operation == "update" else None)
+        if rows:
+            self.change_stream.publish(self.model_name, operation, rows)
+
+    def load_cache(self):
+        """
+        从数据库读取模型表的所有行并填充缓存。
+
+        :return: 按 id 排序的行字典列表，表不存在时返回 None
+        """
+        generation = self.cache.begin_load()
+        database = Database(self.database_name)
+        rows = database.get_rows_page(self.model_name)
+        table_columns = database.get_table_schema(self.model_name) if rows is not None else None
+        database.close_connection()
+        if rows is None:
+            return None
+        self.cache.finish_load(generation, rows, table_columns)
+        return rows
+
+    def get_cached_rows(self):
+        """
+        从缓存获取模型表的所有行，缓存未加载时先从数据库加载。
+
+        :return: 按 id 排序的行字典列表，表不存在时返回 None
+        """
+        rows = self.cache.snapshot()
+        self.cache.record(rows is not None)
+        return rows if rows is not None else self.load_cache()
+
+    def find_cached(self, query_dict):
+        """
+        在缓存中查找所有列都与查询条件相等的行，缓存未加载时先从数据库加载。
+
+        :param query_dict: 包含查询条件的字典，键为列名，值为查询值
+        :return: 按 id 排序的行字典列表，缓存无法回答该查询时返回 None，由调用者直接查询数据库
+        """
+        rows = self.cache.find(query_dict)
+        self.cache.record(rows is not None)
+        # 缓存已加载但无法回答该查询（例如包含表中不存在的列）时重新加载也没有用
+        if rows is None and not self.cache.is_loaded() and self.load_cache() is not None:
+            rows = self.cache.find(query_dict)
+        return rows
+
+    def get_cache_stats(self):
+        """
+        获取模型表缓存的统计数据。
+
+        :return: 包含 hits、misses、hit_rate、loaded、rows 的字典，没有启用缓存时返回 None
+        """
+        return self.cache.get_stats() if self.cache is not None else None
+
+    def get_version(self):
+        """
+        获取模型表的版本号。每次通过 DataModel 添加、更新或删除行后版本号都会增大。
+
+        :return: 由进程标识和版本号组成的字符串
+        """
+        return f"{self.change_notifier.epoch}-{self.change_notifier.get_table_version(self.model_name)}"
+
+    def get_model_list(self, use_cache=True):
         """
         获取模型表中的所有行，如果只有一行则返回一个字典，如果有多行则返回一个包含字典的列表。
 
+        :param use_cache: 是否使用缓存，为 False 时直接读取数据库
         :return: 包含表中所有行的字典列表或单个字典
         """
-        database = Database("db.sqlite3")
+        if use_cache and self.cache is not None:
+            result = self.get_cached_rows()
+            if not result:
+                print(f"DataModel.get_model_list: No valid data or columns for table '{self.model_name}'")
+                return None
+            return result[0] if len(result) == 1 else result
+
+        database = Database(self.database_name)
         table_columns = database.get_columns(self.model_name)
         table_data = database.get_table(self.model_name)
 
+        database.close_connection()
+
         if not table_data or not table_columns:
             print(f"DataModel.get_model_list: No valid data or columns for table '{self.model_name}'")
             return None
 
         result = [{table_columns[i]: row[i] for i in range(len(table_columns))} for row in table_data]
 
+        return result[0] if len(result) == 1 else result
+
+    def iter_model_batches(self, batch_size=500, use_cache=True):
+        """
+        逐批读取模型表中的所有行，读取结束或生成器被关闭时归还数据库连接。存储在内存数据库中的表一次读完后立即归还连接。
+
+        :param batch_size: 每批的行数
+        :param use_cache: 是否使用缓存，为 False 时直接读取数据库
+        :return: 生成器，每次产生一个行字典列表
+        """
+        if use_cache and self.cache is not None:
+            rows = self.get_cached_rows() or []
+            for start in range(0, len(rows), batch_size):
+                yield rows[start:start + batch_size]
+            return
+
+        database = Database(self.database_name)
+        try:
+            if self.storage == "memory":
+                # 内存数据库使用回滚日志，读取期间其他连接不能写入，所以先一次读完再归还连接。
+                # 这类表本来就在内存中，复制一份的开销很小，不会因为客户端读取得慢而阻塞窗口扫描的写入
+                batches = list(database.iter_rows(self.model_name, batch_size))
+            else:
+                yield from database.iter_rows(self.model_name, batch_size)
+                return
+        finally:
+            database.close_connection()
+        yield from batches
+
+    def get_model_page(self, fields=None, limit=None, order_by="id", descending=False, after=None, after_id=None):
+        """
+        分页获取模型表中的行。
+
+        :param fields: 需要返回的列名列表，为空时返回所有列
+        :param limit: 每页最多返回的行数，为空时返回游标之后的所有行
+        :param order_by: 排序列名，默认为 id
+        :param descending: 是否降序
+        :param after: 游标，上一页最后一行的 (order_by 列的值, id)
+        :param after_id: 从 id 为该值的行之后开始，after 为空时使用
+        :return: (行字典列表, 下一页的游标)，没有下一页时游标为 None；列名或 after_id 无效时抛出 ValueError
+        """
+        fields = list(fields) if fields else None
+        # 计算游标需要 id 和排序列，即使客户端没有请求这些列
+        columns = fields + [col for col in ("id", order_by) if col not in fields] if fields else None
+
+        database = Database(self.database_name)
+        try:
+            if after is None and after_id is not None:
+                row = database.get_row_by_column_value(self.model_name, "id", after_id)
+                if row is None:
+                    raise ValueError(f"No row with id {after_id} in table '{self.model_name}'")
+                row = dict(zip(database.get_table_schema(self.model_name), row))
+                if order_by not in row:
+                    raise ValueError(f"Unknown columns {order_by} in table '{self.model_name}'")
+                after = (row[order_by], row["id"])
+            # 多取一行用来判断是否还有下一页
+            rows = database.get_rows_page(self.model_name, columns, order_by, descending, after,
+                                          limit + 1 if limit is not None else None)
+        finally:
+            database.close_connection()
+
+        if rows is None:
+            return [], None
+
+        next_after = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = (rows[-1][order_by], rows[-1]["id"])
+        if fields:
+            rows = [{col: row[col] for col in fields} for row in rows]
+        return rows, next_after
+
+    def search_model(self, text, limit=20, offset=0):
+        """
+        在模型表的全文索引中搜索 fulltext_columns，结果按相关度排序。
+
+        :param text: 搜索文本，按空白拆分为词，所有词都匹配的行才会被返回，以 * 结尾的词按前缀匹配
+        :param limit: 每页最多返回的行数
+        :param offset: 跳过的行数
+        :return: (行字典列表, 下一页的 offset)，每行包括 rank 和 snippet，没有下一页时 offset 为 None；
+                 模型表不支持全文搜索时抛出 ValueError
+        """
+        if not self.fulltext_columns:
+            raise ValueError(f"Full-text search is not supported by table '{self.model_name}'")
+        database = Database(self.database_name)
+        try:
+            # 多取一行用来判断是否还有下一页
+            rows = database.search_fulltext(self.model_name, text, limit=limit + 1, offset=offset)
+        finally:
+            database.close_connection()
+
+        if rows is None:
+            return [], None
+        if len(rows) > limit:
+            return rows[:limit], offset + limit
+        return rows, None
+
+    def count_models(self, condition_dict=None):
+        """
+        在数据库中统计模型表中符合条件的行数，不读取行。
+
+        :param condition_dict: 包含作为查询条件的字段及其对应值的字典，条件之间为 AND 关系，为空时统计所有行
+        :return: 行数，条件无效时返回 None
+        """
+        database = Database(self.database_name)
+        count = database.count_rows(self.model_name, condition_dict)
         database.close_connection()
+        return count
 
-        return result[0] if len(result) == 1 else result
+    def count_models_by(self, column_name):
+        """
+        在数据库中按指定列的值分组统计模型表的行数，不读取行。
+
+        :param column_name: 分组的列名
+        :return: 字典，键为列的值，值为行数；列不存在时返回 None
+        """
+        database = Database(self.database_name)
+        counts = database.count_rows_by(self.model_name, column_name)
+        database.close_connection()
+        return counts
+
+    def get_table_stats(self):
+        """
+        在数据库中统计模型表的行数和占用的字节数，不读取行。
+
+        :return: {"rows": 行数, "storage": 存储方式, "bytes": 表和索引占用的字节数}，
+                 有 toggle_column 时还包括该列为真的行数（键为 toggle_column），
+                 以及该列为真、为假和为空的行数（键为 "<toggle_column>_counts"，值为 {"true": 行数, "false": 行数, "null": 行数}）
+        """
+        database = Database(self.database_name)
+        try:
+            stats = {
+                "rows": database.count_rows(self.model_name),
+                "storage": self.storage,
+                "bytes": database.get_table_size(self.model_name, self.storage),
+            }
+            if self.toggle_column is not None:
+                # 一次 GROUP BY 得到各个值的行数，布尔列中可能存有 0/1、True/False 或 NULL
+                toggle_counts = {"true": 0, "false": 0, "null": 0}
+                for value, count in (database.count_rows_by(self.model_name, self.toggle_column) or {}).items():
+                    toggle_counts["null" if value is None else "true" if value else "false"] += count
+                stats[self.toggle_column] = toggle_counts["true"]
+                stats[f"{self.toggle_column}_counts"] = toggle_counts
+        finally:
+            database.close_connection()
+        return stats
 
-    def get_model(self, query_dict):
+    def get_model(self, query_dict, use_cache=True):
         """
         根据查询条件获取模型表中的一行或多行数据。
         只要该行中有一个参数的值匹配查询条件中的任意一个同名属性的值，则返回该行。
 
         :param query_dict: 包含查询条件的字典，键为列名，值为查询值
+        :param use_cache: 是否使用缓存，为 False 时直接读取数据库
         :return: 包含查询结果的字典或字典列表
         """
-        database = Database("db.sqlite3")
+        if use_cache and self.cache is not None:
+            result = self.find_cached(query_dict)
+            if result is not None:
+                if not result:
+                    print(f"No rows found matching the query in table '{self.model_name}'")
+                    return None
+                return result[0] if len(result) == 1 else result
+
+        database = Database(self.database_name)
         result = database.get_row(self.model_name, query_dict)
         database.close_connection()
         return result
 
-    def add_model_row(self, *model_row_data_list):
+    def add_model_row(self, *model_row_data_list, conflict_columns=None, update_columns=None):
         """
-        添加多行数据到模型表中。
+        添加多行数据到模型表中，所有行在同一个事务中批量插入。
 
         :param model_row_data_list: 包含列名和对应值的字典，可以是多个字典或一个字典的列表
+        :param conflict_columns: 唯一索引的列名列表，与已有行冲突的行将被跳过或更新
+        :param update_columns: 冲突时需要更新的列名列表，为空时跳过冲突的行
+        :return: 包含 inserted、skipped、updated 行数的字典
         """
-        database = Database("db.sqlite3")
-        cur = database.conn.cursor()
-        cur.execute(f"PRAGMA table_info({self.model_name})")
-        table_columns = [col[1] for col in cur.fetchall()]
+        database = Database(self.database_name)
+        table_columns = database.get_table_schema(self.model_name)
 
         # 处理单个字典或字典的列表
         if len(model_row_data_list) == 1 and isinstance(model_row_data_list[0], list):
             model_row_data_list = model_row_data_list[0]
 
+        insert_columns = [col for col in table_columns if col != 'id']
+        rows = []
+        missing_count = 0
         for model_row_data in model_row_data_list:
-            # 过滤掉字典中表中没有的列名
-            filtered_data = {k: v for k, v in model_row_data.items() if k in table_columns}
-
             # 检查字典中的列名是否包含表中的所有必需列（除id外）
-            if all(col in filtered_data for col in table_columns if col != 'id'):
-                values = [filtered_data.get(col) for col in table_columns if col != 'id']
-                database.add_row(self.model_name, *values)
+            if all(col in model_row_data for col in insert_columns):
+                rows.append([model_row_data[col] for col in insert_columns])
             else:
+                missing_count += 1
                 print(f"Some required columns are missing in the provided data for table '{self.model_name}'")
 
-        cur.close()
-        database.close_connection()
+        # 所有行在同一个事务中插入，需要更新缓存或发布变更事件时同时取回写入的行
+        with self.writing():
+            counts = database.add_rows(self.model_name, insert_columns, rows, conflict_columns, update_columns,
+                                       return_rows=self.needs_changed_rows())
+            database.close_connection()
+            inserted_rows = counts.pop("inserted_rows", None)
+            updated_rows = counts.pop("updated_rows", None)
+            if counts["inserted"]:
+                self.publish_change("insert", inserted_rows)
+            if counts["updated"]:
+                self.publish_change("update", updated_rows, update_columns)
+        counts["skipped"] += missing_count
+        return counts
 
     def update_model_row(self, set_dict: dict, condition_dict: dict):
         """
@@ -102,9 +486,175 @@ class DataModel:
         :param set_dict: 包含需要更新的字段及其对应值的字典
         :param condition_dict: 包含作为查询条件的字段及其对应值的字典
         """
-        database = Database("db.sqlite3")
-        database.update_row(self.model_name, set_dict, condition_dict)
-        database.close_connection()
+        with self.writing():
+            collect_rows = self.needs_changed_rows()
+            database = Database(self.database_name)
+            result = database.update_row(self.model_name, set_dict, condition_dict, return_rows=collect_rows)
+            database.close_connection()
+            if result:
+                self.publish_change("update", result if collect_rows else None, list(set_dict.keys()))
+
+    def toggle_model_row(self, condition_dict: dict):
+        """
+        把符合条件的行的 toggle_column 取反。读取、修改和取回修改后的行在一条语句中完成，并发切换时不会丢失修改。
+
+        :param condition_dict: 包含作为查询条件的字段及其对应值的字典
+        :return: 修改后的行（字典）列表，不支持切换或条件无效时返回 None
+        """
+        if self.toggle_column is None:
+            print(f"DataModel.toggle_model_row: Toggle is not supported by table '{self.model_name}'")
+            return None
+        with self.writing():
+            database = Database(self.database_name)
+            rows = database.toggle_column(self.model_name, self.toggle_column, condition_dict, return_rows=True)
+            database.close_connection()
+            if rows:
+                self.publish_change("update", rows, [self.toggle_column])
+        return rows
+
+    def unpin_all(self):
+        """
+        把所有行的 toggle_column 设置为 0（如暂停所有窗口的置顶），并记住被修改的行，之后可以由 repin_all 恢复。
+
+        :return: 被修改的行（字典）列表
+        """
+        return self.set_toggle_column_all(False)
+
+    def repin_all(self):
+        """
+        把之前被 unpin_all 修改的行的 toggle_column 恢复为 1（如继续所有窗口的置顶），已经不存在的行会被忽略。
+
+        :return: 被修改的行（字典）列表
+        """
+        return self.set_toggle_column_all(True)
+
+    def set_toggle_column_all(self, value: bool):
+        """
+        在一条语句中批量设置 toggle_column，实现 unpin_all 和 repin_all。
+
+        :param value: 为 False 时取消所有行，为 True 时恢复之前被取消的行
+        :return: 被修改的行（字典）列表
+        """
+        if self.toggle_column is None:
+            print(f"DataModel.set_toggle_column_all: Toggle is not supported by table '{self.model_name}'")
+            return []
+        key_column = self.key_columns[0]
+        with self.writing(), self.unpinned_lock:
+            database = Database(self.database_name)
+            if value:
+                keys = self.unpinned_keys.pop(self.model_name, set())
+                rows = database.set_column_values(self.model_name, self.toggle_column, 1, key_column, sorted(keys),
+                                                  return_rows=True) if keys else []
+            else:
+                # 只取消为真的行，为 NULL 的行没有被置顶，不需要在恢复时置顶
+                rows = database.set_column_values(self.model_name, self.toggle_column, 0, return_rows=True,
+                                                  only_true=True)
+                # 连续暂停两次时保留第一次记住的行
+                self.unpinned_keys.setdefault(self.model_name, set()).update(row[key_column] for row in rows or ())
+            database.close_connection()
+            if rows:
+                self.publish_change("update", rows, [self.toggle_column])
+        return rows or []
+
+    def prepare_update(self, set_dict):
+        """
+        在更新行之前补充需要一起更新的字段，子类可以重写。
+
+        :param set_dict: 包含需要更新的字段及其对应值的字典
+        :return: 补充后的字典
+        """
+        return set_dict
+
+    def apply_model_batch(self, operations):
+        """
+        在一个事务中执行一组操作，其中任意一个操作无效或失败时，所有操作都不会生效。
+        每个操作是一个字典：
+        - "op": update、toggle 或 delete
+        - key_columns 中的列（至少一个）：作为定位行的条件，多个列之间为 AND 关系
+        - "set": update 时需要更新的字段及其值
+
+        :param operations: 操作字典列表
+        :return: (是否已提交, 每个操作的结果字典列表)
+        """
+        database = Database(self.database_name)
+        table_columns = database.get_table_schema(self.model_name)
+        results = []
+        changes = []
+        with self.writing():
+            try:
+                database.begin_transaction()
+                try:
+                    for operation in operations:
+                        try:
+                            results.append(self.apply_batch_operation(database, table_columns, operation, changes))
+                        except (ValueError, sqlite3.Error) as e:
+                            results.append({"status": "error", "error": str(e)})
+                except BaseException:
+                    database.rollback_transaction()
+                    raise
+                # 提交或撤销失败时事务的嵌套层数已经减少，不能再调用 rollback_transaction，
+                # 未结束的事务在 close_connection 归还连接时由连接池撤销
+                committed = all(result["status"] != "error" for result in results)
+                if committed:
+                    database.commit_transaction()
+                else:
+                    database.rollback_transaction()
+            finally:
+                database.close_connection()
+
+            if committed:
+                for operation, rows, columns in changes:
+                    self.publish_change(operation, rows, columns)
+
+        if not committed:
+            for result in results:
+                if result["status"] != "error":
+                    result["status"] = "rolled_back"
+                    result.pop("rows", None)
+            return False, results
+        return True, results
+
+    def apply_batch_operation(self, database, table_columns, operation, changes):
+        """
+        在批量操作的事务中执行一个操作。
+
+        :param database: 已经开始事务的 Database 实例
+        :param table_columns: 模型表的列名列表
+        :param operation: 操作字典，格式见 apply_model_batch
+        :param changes: 用于收集 (操作类型, 变化的行, 更新的列) 的列表，事务提交后发布
+        :return: 结果字典，status 为 ok 或 not_found，rows 为更新后或被删除的行
+        """
+        if not isinstance(operation, dict):
+            raise ValueError("Operation must be an object")
+        op = operation.get("op")
+        condition_dict = {col: operation[col] for col in self.key_columns if col in operation}
+        if not condition_dict:
+            raise ValueError(f"Operation must contain one of {', '.join(self.key_columns)}")
+
+        if op == "update":
+            set_dict = operation.get("set")
+            if not isinstance(set_dict, dict) or not set_dict:
+                raise ValueError("Update operation must contain a non-empty 'set' object")
+            unknown_columns = [col for col in set_dict if col not in table_columns or col == "id"]
+            if unknown_columns:
+                raise ValueError(f"Unknown columns {', '.join(unknown_columns)} in table '{self.model_name}'")
+            set_dict = self.prepare_update(dict(set_dict))
+            rows = database.update_row(self.model_name, set_dict, condition_dict, return_rows=True)
+            columns = list(set_dict.keys())
+        elif op == "toggle":
+            if self.toggle_column is None:
+                raise ValueError(f"Toggle is not supported by table '{self.model_name}'")
+            rows = database.toggle_column(self.model_name, self.toggle_column, condition_dict, return_rows=True)
+            columns = [self.toggle_column]
+        elif op == "delete":
+            rows = database.delete_row_by_conditions(self.model_name, condition_dict, return_rows=True)
+            columns = None
+        else:
+            raise ValueError(f"Unsupported operation '{op}'")
+
+        if rows:
+            changes.append(("delete" if op == "delete" else "update", rows, columns))
+        return {"status": "ok" if rows else "not_found", "rows": rows or []}
 
     def delete_model_row(self, condition_column, condition_value):
         """
@@ -113,20 +663,72 @@ class DataModel:
         :param condition_column: 条件列名
         :param condition_value: 条件值
         """
-        database = Database("db.sqlite3")
-        database.delete_row(self.model_name, condition_column, condition_value)
+        with self.writing():
+            collect_rows = self.needs_changed_rows()
+            database = Database(self.database_name)
+            result = database.delete_row(self.model_name, condition_column, condition_value,
+                                         return_rows=collect_rows)
+            database.close_connection()
+            if result:
+                self.publish_change("delete", result if collect_rows else None)
+
+    def find_models_containing(self, column_name, text, limit=None):
+        """
+        获取模型表中某一列包含指定子字符串的行（如标题包含 "Notepad" 的窗口），列在 substring_columns 中时使用 trigram 索引。
+
+        :param column_name: 列名
+        :param text: 子字符串，不区分 ASCII 字母的大小写
+        :param limit: 最多返回的行数，为空时返回所有匹配的行
+        :return: 行字典列表，按 id 排序
+        """
+        database = Database(self.database_name)
+        rows = database.get_rows_within_value(self.model_name, column_name, text, limit)
         database.close_connection()
+        return rows or []
+
+    def delete_models_containing(self, column_name, text):
+        """
+        删除模型表中某一列包含指定子字符串的行，列在 substring_columns 中时使用 trigram 索引。
+
+        :param column_name: 列名
+        :param text: 子字符串，不区分 ASCII 字母的大小写
+        :return: 被删除的行数
+        """
+        with self.writing():
+            collect_rows = self.needs_changed_rows()
+            database = Database(self.database_name)
+            result = database.delete_row_within_value(self.model_name, column_name, text, return_rows=collect_rows)
+            database.close_connection()
+            if result:
+                self.publish_change("delete", result if collect_rows else None)
+        return (len(result) if collect_rows else result) if result else 0
 
     def delete_all_rows(self):
         """
         删除模型表中的所有数据。
         """
-        database = Database("db.sqlite3")
-        database.delete_all_rows(self.model_name)
-        database.close_connection()
+        with self.writing():
+            collect_rows = self.needs_changed_rows()
+            database = Database(self.database_name)
+            result = database.delete_all_rows(self.model_name, return_rows=collect_rows)
+            database.close_connection()
+            if result:
+                self.publish_change("delete", result if collect_rows else None)
 
 
 class CurrentWindows(DataModel):
+    # hwnd 唯一，按 name 查询（如同步笔记）时使用 name 索引
+    unique_indexes = (("hwnd",),)
+    indexes = (("name",),)
+    # hwnd 与已有行冲突时的处理方式：skip 跳过该行，update 用新数据更新已有行的 name 和 is_set_top
+    hwnd_conflict_action = "skip"
+    key_columns = ("hwnd", "name")
+    toggle_column = "is_set_top"
+    # 前端频繁读取当前窗口列表，在内存中缓存
+    cache_enabled = True
+    # 每次启动和关闭软件时都会清空，不需要写入磁盘
+    storage = "memory"
+
     def __init__(self):
         super().__init__(
             "current_windows",
@@ -136,45 +738,51 @@ class CurrentWindows(DataModel):
             notes="TEXT"
         )
 
-    def get_model(self, query_dict):
+    def get_model(self, query_dict, use_cache=True):
         """
         根据查询条件获取模型表中的一行或多行数据。
         优先以 hwnd 查询，如果查询参数有 hwnd 并且有匹配的项，则仅返回该行。
         否则，调用父类的方法返回匹配项。
 
         :param query_dict: 包含查询条件的字典，键为列名，值为查询值
+        :param use_cache: 是否使用缓存，为 False 时直接读取数据库
         :return: 包含查询结果的字典或字典列表
         """
-        if "hwnd" in query_dict:
+        if "hwnd" in query_dict and use_cache and self.cache is not None:
+            result = self.find_cached({"hwnd": query_dict["hwnd"]})
+            if result:
+                return result[0]
+        elif "hwnd" in query_dict:
             hwnd_value = query_dict["hwnd"]
-            database = Database("db.sqlite3")
+            database = Database(self.database_name)
             result = database.get_row_by_column_value(self.model_name, "hwnd", hwnd_value)
+            table_columns = database.get_columns(self.model_name) if result else None
+            database.close_connection()
             if result:
-                table_columns = database.get_columns(self.model_name)
                 return {table_columns[i]: result[i] for i in range(len(table_columns))}
-        return super().get_model(query_dict)
+        return super().get_model(query_dict, use_cache)
 
-    def add_model_row(self, *model_row_data_list):
+    def add_model_row(self, *model_row_data_list, on_conflict=None):
         """
         添加多行数据到模型表中。
-        如果输入的字典中有与现有模型中的 hwnd 值相同的模型，则不添加该模型。
+        如果输入的字典中有与现有模型中的 hwnd 值相同的模型，则根据 on_conflict 跳过该模型或更新已有模型的 name 和 is_set_top，
+        该判断由 hwnd 唯一索引在数据库中完成。
         如果输入的字典列表中有多个字典拥有相同的 hwnd 值，则只保留第一个。
 
         :param model_row_data_list: 包含列名和对应值的字典，可以是多个字典或一个字典的列表
+        :param on_conflict: hwnd 冲突时的处理方式，可选 skip 或 update，默认为 hwnd_conflict_action
+        :return: 包含 inserted、skipped、updated 行数的字典
         """
-        existing_rows = self.get_model_list()
-        if existing_rows is None:
-            existing_rows = []
-
-        existing_hwnd_set = {row["hwnd"] for row in existing_rows if "hwnd" in row}
+        on_conflict = on_conflict or self.hwnd_conflict_action
+        update_columns = ["name", "is_set_top"] if on_conflict == "update" else None
         seen_hwnd_set = set()
+        duplicate_count = 0
 
         def process_row(row):
+            nonlocal duplicate_count
             if "hwnd" in row:
-                if row["hwnd"] in existing_hwnd_set:
-                    print(f"Model with hwnd {row['hwnd']} already exists, skipping.")
-                    return None
                 if row["hwnd"] in seen_hwnd_set:
+                    duplicate_count += 1
                     print(
                         f"Model with hwnd {row['hwnd']} found in input list multiple times, keeping first occurrence.")
                     return None
@@ -194,11 +802,93 @@ class CurrentWindows(DataModel):
                 if processed_row:
                     filtered_rows.append(processed_row)
 
-        if filtered_rows:
-            super().add_model_row(filtered_rows)
+        counts = super().add_model_row(filtered_rows, conflict_columns=["hwnd"], update_columns=update_columns)
+        counts["skipped"] += duplicate_count
+        return counts
+
+    def sync_snapshot(self, windows, all_windows=None):
+        """
+        用一次完整的窗口枚举结果同步模型表：只插入新打开的窗口、删除已关闭的窗口、修改改名窗口的 name，
+        其余窗口的 is_set_top 和 notes 保持不变。所有修改在一个事务中完成，没有变化时不写入数据库。
+
+        :param windows: 窗口字典列表，每个字典包含 hwnd 和 name，hwnd 重复时只保留第一个
+        :param all_windows: AllWindows 实例，不为空时在同一个事务中把新出现的窗口名称添加到 all_windows
+        :return: 包含 inserted、closed、renamed 行数的字典
+        """
+        snapshot = {}
+        for window in windows:
+            snapshot.setdefault(str(window["hwnd"]), window["name"])
+
+        all_windows_writing = all_windows.writing() if all_windows is not None else contextlib.nullcontext()
+        with self.writing(), all_windows_writing:
+            # 持有写锁时缓存与数据库一致，可以直接用缓存计算差异。扫描不是客户端的读取，不计入缓存的命中统计
+            rows = None
+            if self.cache is not None:
+                rows = self.cache.snapshot()
+                if rows is None:
+                    rows = self.load_cache()
+            database = Database(self.database_name)
+            try:
+                if rows is None:
+                    rows = database.get_rows_page(self.model_name, ["id", "hwnd", "name"]) or []
+                current = {row["hwnd"]: row["name"] for row in rows}
+                opened = [[name, hwnd, False, ""] for hwnd, name in snapshot.items() if hwnd not in current]
+                closed = [hwnd for hwnd in current if hwnd not in snapshot]
+                renamed = [(hwnd, name) for hwnd, name in snapshot.items()
+                           if hwnd in current and current[hwnd] != name]
+                counts = {"inserted": len(opened), "closed": len(closed), "renamed": len(renamed)}
+                if not (opened or closed or renamed):
+                    return counts
+
+                collect_rows = self.needs_changed_rows()
+                changes = []
+                with database.transaction():
+                    if opened:
+                        result = database.add_rows(self.model_name, ["name", "hwnd", "is_set_top", "notes"], opened,
+                                                   ["hwnd"], return_rows=collect_rows)
+                        counts["inserted"] = result["inserted"]
+                        if result["inserted"]:
+                            changes.append((self, "insert", result.get("inserted_rows"), None))
+                    if closed:
+                        closed_rows = []
+                        for hwnd in closed:
+                            closed_rows.extend(database.delete_row_by_conditions(self.model_name, {"hwnd": hwnd},
+                                                                                 return_rows=True))
+                        changes.append((self, "delete", closed_rows, None))
+                    if renamed:
+                        renamed_rows = []
+                        for hwnd, name in renamed:
+                            renamed_rows.extend(database.update_row(self.model_name, {"name": name}, {"hwnd": hwnd},
+                                                                    return_rows=True))
+                        changes.append((self, "update", renamed_rows, ["name"]))
+
+                    if all_windows is not None:
+                        names = dict.fromkeys(all_windows.normalize_name(name) for name, *_ in opened)
+                        names.update(dict.fromkeys(all_windows.normalize_name(name) for _, name in renamed))
+                        existing_names = database.get_existing_values(all_windows.model_name, "name", names)
+                        current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
+                        new_names = [[name, current_time, ""] for name in names if name not in existing_names]
+                        if new_names:
+                            result = database.add_rows(all_windows.model_name, ["name", "date", "notes"], new_names,
+                                                       return_rows=all_windows.needs_changed_rows())
+                            if result["inserted"]:
+                                changes.append((all_windows, "insert", result.get("inserted_rows"), None))
+            finally:
+                database.close_connection()
+
+            for model, operation, changed_rows, columns in changes:
+                model.publish_change(operation, changed_rows, columns)
+        return counts
 
 
 class AllWindows(DataModel):
+    # 按 name 查询和按 (id, name) 与 current_windows 同步笔记时使用的索引
+    indexes = (("name",), ("id", "name"))
+    key_columns = ("id", "name")
+    fulltext_columns = ("name", "notes")
+    # 窗口名称经常按子字符串查找。current_windows 只有当前打开的窗口，逐行比较已经足够快，不建立该索引
+    substring_columns = ("name",)
+
     def __init__(self):
         super().__init__(
             "all_windows",
@@ -218,8 +908,8 @@ class AllWindows(DataModel):
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
 
         def process_row(row):
-            if 'name' in row and ' - ' in row['name']:
-                row['name'] = row['name'].split(' - ', 1)[1]
+            if 'name' in row:
+                row['name'] = self.normalize_name(row['name'])
             row['date'] = current_time
             return row
 
@@ -232,7 +922,17 @@ class AllWindows(DataModel):
             elif isinstance(model_row_data, dict):
                 processed_rows.append(process_row(model_row_data))
 
-        super().add_model_row(*processed_rows)
+        return super().add_model_row(*processed_rows)
+
+    @staticmethod
+    def normalize_name(name):
+        """
+        把窗口标题转换为 all_windows 中保存的名称：如果包含 ' - '，则只保留 ' - ' 之后的内容。
+
+        :param name: 窗口标题
+        :return: 保存的名称
+        """
+        return name.split(' - ', 1)[1] if ' - ' in name else name
 
     def update_model_row(self, set_dict, condition_dict):
         """
@@ -242,9 +942,18 @@ class AllWindows(DataModel):
         :param set_dict: 包含需要更新的字段及其对应值的字典
         :param condition_dict: 包含作为查询条件的字段及其对应值的字典
         """
+        super().update_model_row(self.prepare_update(set_dict), condition_dict)
+
+    def prepare_update(self, set_dict):
+        """
+        将模型中的‘date’字段（上次更新时间）更新成当前时间。
+
+        :param set_dict: 包含需要更新的字段及其对应值的字典
+        :return: 补充后的字典
+        """
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
         set_dict['date'] = current_time
-        super().update_model_row(set_dict, condition_dict)
+        return set_dict
 
 
 if __name__ == '__main__':
@@ -289,7 +998,9 @@ if __name__ == '__main__':
         # "hwnd": "1234"
     }
 
-    windows.add_model_row(row_data)
+    # all_windows 有全文索引的同步触发器，触发器写入的行不计入统计
+    counts = windows.add_model_row(row_data)
+    assert counts == {"inserted": 3, "skipped": 0, "updated": 0}, counts
     print(windows.get_model_list())
 
     windows.update_model_row(update_date, update_condition_data)
@@ -297,5 +1008,99 @@ if __name__ == '__main__':
 
     print(windows.get_model(search_data))
 
+    print(windows.search_model("window*"))
+
     windows.delete_model_row("name", "window1")
     print(windows.get_model_list())
+
+    # upsert 时插入、跳过和更新的行数之和等于输入的行数
+    current_windows = CurrentWindows()
+    current_windows.create_model_table()
+    current_windows.delete_all_rows()
+    current_rows = [{"name": f"window{i}", "hwnd": str(i), "is_set_top": False, "notes": ""} for i in range(5)]
+    counts = current_windows.add_model_row(current_rows)
+    assert counts == {"inserted": 5, "skipped": 0, "updated": 0}, counts
+    current_rows = [{"name": f"renamed window{i}", "hwnd": str(i), "is_set_top": False, "notes": ""} for i in range(3, 8)]
+    counts = current_windows.add_model_row(current_rows, on_conflict="update")
+    assert counts == {"inserted": 3, "skipped": 0, "updated": 2}, counts
+    counts = current_windows.add_model_row(current_rows, on_conflict="update")
+    assert counts == {"inserted": 0, "skipped": 5, "updated": 0}, counts
+
+    # 统计由数据库完成：按置顶状态分组的行数之和等于总行数
+    current_windows.toggle_model_row({"hwnd": "0"})
+    current_windows.toggle_model_row({"hwnd": "1"})
+    current_windows.update_model_row({"is_set_top": None}, {"hwnd": "2"})
+    assert current_windows.count_models_by("no_such_column") is None
+    stats = current_windows.get_table_stats()
+    assert stats["is_set_top_counts"] == {"true": 2, "false": 5, "null": 1}, stats
+    assert stats["is_set_top"] == 2 and stats["rows"] == 8, stats
+
+    # 缓存无法回答的查询直接查询数据库，不会重新加载整个表
+    current_windows.get_model_list()
+    cached_rows = current_windows.cache.rows
+    assert cached_rows is not None
+    assert current_windows.get_model({"no_such_column": "window2"}) is None
+    assert current_windows.cache.rows is cached_rows
+
+    # 窗口扫描读取缓存计算差异，但不计入缓存的命中统计
+    cache_stats = current_windows.get_cache_stats()
+    scanned_windows = [{"hwnd": row["hwnd"], "name": row["name"]} for row in current_windows.get_model_list(use_cache=False)]
+    for _ in range(10):
+        current_windows.sync_snapshot(scanned_windows)
+    assert current_windows.get_cache_stats() == cache_stats, (cache_stats, current_windows.get_cache_stats())
+
+    # 多个线程同时写入和读取：缓存随写入同步更新，结束后与数据库中的表一致，读取全部命中缓存
+    def write_rows(writer):
+        for i in range(50):
+            hwnd = f"{writer}-{i}"
+            current_windows.add_model_row({"name": f"window {hwnd}", "hwnd": hwnd, "is_set_top": False, "notes": ""})
+            current_windows.update_model_row({"notes": f"notes {hwnd}"}, {"hwnd": hwnd})
+            current_windows.toggle_model_row({"hwnd": hwnd})
+            current_windows.toggle_model_row({"hwnd": str(i % 8)})
+            if i % 3 == 0:
+                current_windows.delete_model_row("hwnd", hwnd)
+
+    reads = [0] * 4
+
+    def read_rows(reader):
+        while True:
+            current_windows.get_model_list()
+            current_windows.get_model({"hwnd": str(reader)})
+            reads[reader] += 2
+            if not any(thread.is_alive() for thread in writer_threads):
+                break
+
+    cache_stats = current_windows.get_cache_stats()
+    writer_threads = [threading.Thread(target=write_rows, args=(writer,)) for writer in range(4)]
+    reader_threads = [threading.Thread(target=read_rows, args=(reader,)) for reader in range(4)]
+    for thread in writer_threads + reader_threads:
+        thread.start()
+    for thread in writer_threads + reader_threads:
+        thread.join()
+    assert current_windows.get_model_list() == current_windows.get_model_list(use_cache=False)
+    new_cache_stats = current_windows.get_cache_stats()
+    assert new_cache_stats["hits"] - cache_stats["hits"] == sum(reads) + 1, (cache_stats, new_cache_stats, reads)
+    assert new_cache_stats["misses"] == cache_stats["misses"], (cache_stats, new_cache_stats)
+    assert new_cache_stats["rows"] == current_windows.count_models()
+
+    # 声明的索引可以重复创建，按 hwnd 和 name 查询时使用索引而不是扫描整个表
+    current_windows.create_model_table()
+    database = Database(current_windows.database_name)
+    for table, column in (("current_windows", "hwnd"), ("current_windows", "name"), ("all_windows", "name")):
+        plan = database.explain_query_plan(f"SELECT * FROM {table} WHERE {column} = ?", ("window1",))
+        assert any(step.startswith("SEARCH") and "INDEX" in step for step in plan), (table, column, plan)
+    database.close_connection()
+
+    # 子字符串查询：匹配的行较少时使用 trigram 索引，匹配的行很多时逐行比较，两种方式的结果与 LIKE 相同
+    windows.add_model_row([{"name": f"{'Notepad' if i % 2 else 'Excel'} file{i}.txt", "notes": ""}
+                           for i in range(3000)])
+    database = Database(windows.database_name)
+    for text, use_index in (("file1234.", True), ("notepad", False), ("ab", False)):
+        condition, pattern = database.build_contains_condition("all_windows", "name", text)
+        plan = database.explain_query_plan(f"SELECT * FROM all_windows WHERE {condition}", (pattern,))
+        assert any("all_windows_trigram" in step for step in plan) == use_index, (text, plan)
+        like_ids = [row[0] for row in database.conn.execute(
+            "SELECT id FROM all_windows WHERE name LIKE ? ORDER BY id", (pattern,))]
+        assert [row["id"] for row in windows.find_models_containing("name", text)] == like_ids, text
+    database.close_connection()
+    print(windows.find_models_containing("name", "file1234."))
@@ -1,17 +1,444 @@
+import contextlib
+import functools
+import json
 import sqlite3
+import threading
+import uuid
+import weakref
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    连接池使用的连接类型，sqlite3.Connection 本身不支持弱引用，子类化后连接池可以用弱引用追踪连接。
+    """
+    # 该连接当前应用的性能配置名称
+    profile_name = None
+
+
+class ConnectionPool:
+    # 按数据库名称保存的连接池实例
+    pools = {}
+    pools_lock = threading.Lock()
+
+    # 性能配置，在连接打开时按顺序执行对应的 PRAGMA
+    # - safe: SQLite 默认的回滚日志，每次提交都同步到磁盘
+    # - performance: WAL 日志，读写互不阻塞，提交时不强制同步，并启用内存映射和更大的页缓存
+    performance_profiles = {
+        "safe": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "mmap_size": 0,
+            "cache_size": -2000,
+            "temp_store": "DEFAULT",
+            "busy_timeout": 5000,
+        },
+        "performance": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 268435456,
+            "cache_size": -16000,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+        },
+    }
+    # 未单独配置的数据库使用的性能配置
+    default_profile_name = "performance"
+    # 附加到每个连接上的进程内内存数据库的 schema 名称，用于存放不需要持久化的表
+    memory_schema = "memory"
+
+    def __init__(self, database_name, max_idle_per_thread=2, profile_name=None):
+        """
+        初始化连接池。每个线程保存自己的空闲连接，连接在同一线程内被反复借出和归还，
+        避免每次操作都重新打开数据库并解析表结构。
+
+        :param database_name: 数据库名称
+        :param max_idle_per_thread: 每个线程最多保留的空闲连接数，超出的连接在归还时直接关闭
+        :param profile_name: 性能配置名称，默认为 default_profile_name
+        """
+        self.database_name = database_name
+        self.max_idle_per_thread = max_idle_per_thread
+        self.profile_name = profile_name or self.default_profile_name
+        self.local = threading.local()
+        self.connections = weakref.WeakSet()
+        self.connections_lock = threading.Lock()
+        # 该连接池所有连接共享的内存数据库（memdb VFS），只要还有一个连接打开，其中的数据就一直存在
+        self.memory_database_uri = f"file:/{uuid.uuid4().hex}.sqlite3?vfs=memdb"
+        self.memory_anchor = None
+
+    @classmethod
+    def get_pool(cls, database_name):
+        """
+        获取指定数据库的连接池，不存在时创建。
+
+        :param database_name: 数据库名称
+        :return: ConnectionPool 实例
+        """
+        with cls.pools_lock:
+            pool = cls.pools.get(database_name)
+            if pool is None:
+                pool = cls(database_name)
+                cls.pools[database_name] = pool
+            return pool
+
+    @classmethod
+    def set_performance_profile(cls, database_name, profile_name):
+        """
+        为指定数据库选择性能配置。已经打开的连接会在下一次借出时应用新的配置。
+
+        :param database_name: 数据库名称
+        :param profile_name: 性能配置名称，必须是 performance_profiles 中的键
+        """
+        if profile_name not in cls.performance_profiles:
+            print(f"Performance profile '{profile_name}' does not exist!")
+            return
+        cls.get_pool(database_name).profile_name = profile_name
+
+    def apply_performance_profile(self, conn):
+        """
+        在连接上执行当前性能配置中的 PRAGMA。
+
+        :param conn: sqlite3.Connection 实例
+        """
+        for pragma, value in self.performance_profiles[self.profile_name].items():
+            conn.execute(f"PRAGMA {pragma} = {value}").fetchall()
+        conn.profile_name = self.profile_name
+
+    def get_idle_connections(self):
+        """
+        获取当前线程的空闲连接列表。
+
+        :return: 空闲连接列表
+        """
+        idle_connections = getattr(self.local, "idle_connections", None)
+        if idle_connections is None:
+            idle_connections = []
+            self.local.idle_connections = idle_connections
+        return idle_connections
+
+    def connect(self):
+        """
+        新建一个数据库连接。
+
+        :return: sqlite3.Connection 实例
+        """
+        conn = sqlite3.connect(self.database_name, check_same_thread=False, factory=PooledConnection,
+                               cached_statements=256, uri=True)
+        self.apply_performance_profile(conn)
+        with self.connections_lock:
+            # 单独保持一个连接，空闲连接全部关闭时内存数据库也不会被释放
+            if self.memory_anchor is None:
+                self.memory_anchor = sqlite3.connect(self.memory_database_uri, check_same_thread=False, uri=True)
+            self.connections.add(conn)
+        conn.execute("ATTACH DATABASE ? AS " + self.memory_schema, (self.memory_database_uri,))
+        return conn
+
+    @staticmethod
+    def is_healthy(conn):
+        """
+        检查连接是否仍然可用。
+
+        :param conn: sqlite3.Connection 实例
+        :return: 可用返回 True，否则返回 False
+        """
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def get_connection(self):
+        """
+        借出一个连接。优先复用当前线程的空闲连接，复用前进行健康检查，不可用的连接会被丢弃。
+
+        :return: sqlite3.Connection 实例
+        """
+        idle_connections = self.get_idle_connections()
+        while idle_connections:
+            conn = idle_connections.pop()
+            if self.is_healthy(conn):
+                if conn.profile_name != self.profile_name:
+                    self.apply_performance_profile(conn)
+                return conn
+            self.discard_connection(conn)
+        return self.connect()
+
+    def release_connection(self, conn):
+        """
+        归还一个连接。未提交的事务会被回滚，空闲连接数已满时直接关闭该连接。
+
+        :param conn: sqlite3.Connection 实例
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard_connection(conn)
+            return
+
+        idle_connections = self.get_idle_connections()
+        if len(idle_connections) < self.max_idle_per_thread:
+            idle_connections.append(conn)
+        else:
+            self.discard_connection(conn)
+
+    def discard_connection(self, conn):
+        """
+        关闭并丢弃一个连接。
+
+        :param conn: sqlite3.Connection 实例
+        """
+        with self.connections_lock:
+            self.connections.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """
+        关闭连接池创建的所有连接，内存数据库中的表随之被释放。
+        """
+        with self.connections_lock:
+            connections = list(self.connections)
+            self.connections = weakref.WeakSet()
+            if self.memory_anchor is not None:
+                connections.append(self.memory_anchor)
+                self.memory_anchor = None
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self.local = threading.local()
 
 
 class Database:
     table_names = []
     columns_list = ['ID']
 
+    # 表的存储方式对应的 schema：disk 存放在数据库文件中，memory 存放在进程内的内存数据库中，不会写入磁盘。
+    # 两种表可以在同一条语句中联合查询，语句中的表名不需要加 schema 前缀
+    storage_schemas = {"disk": "main", "memory": ConnectionPool.memory_schema}
+
+    # 表结构缓存，键为 (数据库名称, 表名)，值为列名列表
+    schema_cache = {}
+    # 表结构缓存建立时数据库的 schema_version，键为数据库名称
+    schema_versions = {}
+    schema_cache_lock = threading.Lock()
+
+    # “列值包含子字符串”的查询在使用 trigram 索引前先抽样的行数，以及使用索引时样本中匹配行的最大比例。
+    # 匹配的行很多时通过索引逐行取回比直接扫描整个表更慢
+    substring_sample_size = 2000
+    substring_index_max_ratio = 0.05
+
     def __init__(self, database_name):
         """
-        初始化数据库连接。
+        初始化数据库连接。连接从该数据库的连接池中借出，调用 close_connection 时归还。
         :param database_name: 数据库名称
         """
         self.database_name = database_name
-        self.conn = sqlite3.connect(self.database_name, check_same_thread=False)
+        self.pool = ConnectionPool.get_pool(self.database_name)
+        self.conn = self.pool.get_connection()
+        # 显式事务的嵌套层数，大于 0 时各个方法不单独提交
+        self.transaction_depth = 0
+        # 其他进程（例如另一个服务器实例）可能修改了表结构，借出连接时检查一次，读取文件头中的版本号开销很小
+        self.check_schema_version()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def build_statement(operation, table_name, columns=(), condition_columns=(), conflict_columns=(),
+                        update_columns=(), returning=False):
+        """
+        生成 SQL 语句并缓存。相同的 (操作, 表名, 列, 条件列) 总是得到同一个字符串，
+        从而命中 sqlite3 连接的预编译语句缓存。
+
+        :param operation: 操作类型，可选 select、count、insert、upsert、update、toggle、delete
+        :param table_name: 表名
+        :param columns: 插入或更新的列名元组，toggle 时为需要取反的列名元组
+        :param condition_columns: WHERE 条件中的列名元组，条件之间为 AND 关系
+        :param conflict_columns: upsert 时唯一索引的列名元组
+        :param update_columns: upsert 冲突时需要更新的列名元组，为空时跳过冲突的行
+        :param returning: 是否返回被写入的行（RETURNING *），对 select 无效
+        :return: SQL 语句
+        """
+        if operation == "toggle":
+            # 在一条语句中读取并取反，不需要先查询再更新
+            columns = tuple(f"{col} = CASE WHEN {col} THEN 0 ELSE 1 END" for col in columns)
+        condition_clause = ' AND '.join([f"{col} = ?" for col in condition_columns])
+        where_clause = f" WHERE {condition_clause}" if condition_clause else ""
+        returning_clause = " RETURNING *" if returning else ""
+        if operation == "select":
+            return f"SELECT * FROM {table_name}{where_clause}"
+        if operation == "count":
+            return f"SELECT COUNT(*) FROM {table_name}{where_clause}"
+        if operation == "insert":
+            placeholders = ', '.join(['?'] * len(columns))
+            return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}){returning_clause}"
+        if operation == "upsert":
+            placeholders = ', '.join(['?'] * len(columns))
+            query = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}) "
+                     f"ON CONFLICT ({', '.join(conflict_columns)}) ")
+            if not update_columns:
+                return query + "DO NOTHING" + returning_clause
+            # 只有值确实发生变化时才更新，未变化的行计为跳过
+            set_clause = ', '.join([f"{col} = excluded.{col}" for col in update_columns])
+            changed_clause = ' OR '.join([f"{col} IS NOT excluded.{col}" for col in update_columns])
+            return query + f"DO UPDATE SET {set_clause} WHERE {changed_clause}" + returning_clause
+        if operation == "toggle":
+            return f"UPDATE {table_name} SET {', '.join(columns)}{where_clause}{returning_clause}"
+        if operation == "update":
+            set_clause = ', '.join([f"{col} = ?" for col in columns])
+            return f"UPDATE {table_name} SET {set_clause}{where_clause}{returning_clause}"
+        if operation == "delete":
+            return f"DELETE FROM {table_name}{where_clause}{returning_clause}"
+        raise ValueError(f"Unsupported operation '{operation}'")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def build_page_statement(table_name, columns, order_by="id", descending=False, cursor_kind=None,
+                             has_limit=False):
+        """
+        生成分页查询语句并缓存。行按 (order_by, id) 排序，使用键集分页：
+        游标为上一页最后一行的 (order_by 的值, id)，查询通过索引直接定位到游标之后的行，不需要 OFFSET 跳过前面的行。
+        无论升序还是降序，order_by 为 NULL 的行都排在最前面。
+
+        :param table_name: 表名
+        :param columns: 查询的列名元组
+        :param order_by: 排序列名
+        :param descending: 是否降序
+        :param cursor_kind: 游标条件的类型，None 表示没有游标，"value" 表示游标的 order_by 值不为 NULL，"null" 表示为 NULL
+        :param has_limit: 是否限制行数
+        :return: SQL 语句
+        """
+        direction = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+        where_clause = ""
+        if cursor_kind and order_by == "id":
+            where_clause = f" WHERE id {comparison} ?"
+        elif cursor_kind == "value":
+            where_clause = f" WHERE ({order_by}, id) {comparison} (?, ?)"
+        elif cursor_kind == "null":
+            where_clause = f" WHERE ({order_by} IS NULL AND id {comparison} ?) OR {order_by} IS NOT NULL"
+        order_clause = f" ORDER BY {order_by} {direction}"
+        if order_by != "id":
+            order_clause = f" ORDER BY {order_by} {direction}{' NULLS FIRST' if descending else ''}, id {direction}"
+        limit_clause = " LIMIT ?" if has_limit else ""
+        return f"SELECT {', '.join(columns)} FROM {table_name}{where_clause}{order_clause}{limit_clause}"
+
+    def begin_transaction(self):
+        """
+        开始一个显式事务，之后各个方法的修改在 commit_transaction 时一起提交，或者在 rollback_transaction 时一起撤销。
+        已经在事务中时创建一个保存点，可以嵌套使用。
+        """
+        if self.transaction_depth == 0:
+            # 立即获取写锁，避免事务中途因为其他连接写入而失败
+            self.conn.execute("BEGIN IMMEDIATE")
+        else:
+            self.conn.execute(f"SAVEPOINT transaction_{self.transaction_depth}")
+        self.transaction_depth += 1
+
+    def commit_transaction(self):
+        """
+        提交由 begin_transaction 开始的事务，嵌套时释放对应的保存点。
+        """
+        self.transaction_depth -= 1
+        if self.transaction_depth == 0:
+            self.conn.commit()
+        else:
+            self.conn.execute(f"RELEASE transaction_{self.transaction_depth}")
+
+    def rollback_transaction(self):
+        """
+        撤销由 begin_transaction 开始的事务，嵌套时只撤销到对应的保存点。
+        """
+        self.transaction_depth -= 1
+        if self.transaction_depth == 0:
+            self.conn.rollback()
+        else:
+            self.conn.execute(f"ROLLBACK TO transaction_{self.transaction_depth}")
+            self.conn.execute(f"RELEASE transaction_{self.transaction_depth}")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        在 with 语句中使用的事务，正常结束时提交，发生异常时撤销并重新抛出异常。
+        """
+        self.begin_transaction()
+        try:
+            yield self
+        except BaseException:
+            self.rollback_transaction()
+            raise
+        self.commit_transaction()
+
+    def commit(self):
+        """
+        提交当前的修改。在显式事务中时不提交，由事务结束时统一提交。
+        """
+        if self.transaction_depth == 0:
+            self.conn.commit()
+
+    @staticmethod
+    def rows_to_dicts(cur, rows):
+        """
+        把查询结果转换为字典列表，键为列名。
+
+        :param cur: 执行查询的游标
+        :param rows: 查询结果
+        :return: 字典列表
+        """
+        columns = [description[0] for description in cur.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_table_schema(self, table_name):
+        """
+        获取指定表的列名，结果会被缓存，直到 create_table 使其失效，或者创建 Database 实例时发现表结构已被修改。
+
+        :param table_name: 表名
+        :return: 列名列表，表不存在时为空列表
+        """
+        key = (self.database_name, table_name)
+        columns = self.schema_cache.get(key)
+        if columns is None:
+            cur = self.conn.cursor()
+            cur.execute(f"PRAGMA table_info({table_name})")
+            columns = [info[1] for info in cur.fetchall()]
+            cur.close()
+            # 不缓存不存在的表，以免表创建后仍读到空结果
+            if columns:
+                with self.schema_cache_lock:
+                    self.schema_cache[key] = columns
+        return columns
+
+    def invalidate_schema_cache(self, table_name=None):
+        """
+        使表结构缓存失效。
+
+        :param table_name: 表名，为空时使该数据库所有表的缓存失效
+        """
+        with self.schema_cache_lock:
+            for key in list(self.schema_cache.keys()):
+                if key[0] == self.database_name and (table_name is None or key[1] == table_name):
+                    del self.schema_cache[key]
+
+    def check_schema_version(self):
+        """
+        检查数据库的 schema_version，若与建立缓存时不同（例如其他进程修改了表结构），则清空该数据库的表结构缓存。
+
+        :return: 缓存被清空时返回 True，否则返回 False
+        """
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA schema_version")
+        schema_version = cur.fetchone()[0]
+        cur.close()
+
+        with self.schema_cache_lock:
+            cached_version = self.schema_versions.get(self.database_name)
+            self.schema_versions[self.database_name] = schema_version
+        if cached_version is not None and cached_version != schema_version:
+            self.invalidate_schema_cache()
+            return True
+        return False
 
     def get_columns(self, table_name):
         """
@@ -19,16 +446,11 @@ class Database:
         :param table_name: 表名
         :return: 列名列表
         """
-        cur = self.conn.cursor()
         if table_name not in self.table_names:
             print(f"{table_name} does not exist!")
             return None
 
-        cur.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cur.fetchall()
-        columns = [info[1] for info in columns_info]
-        cur.close()
-        return columns
+        return list(self.get_table_schema(table_name))
 
     def get_table(self, table_name="none"):
         """
@@ -48,6 +470,69 @@ class Database:
         cur.close()
         return table
 
+    def iter_rows(self, table_name, batch_size=500):
+        """
+        按 id 顺序逐批读取表中的所有行，内存中每次只保留一批行。
+
+        :param table_name: 表名
+        :param batch_size: 每批的行数
+        :return: 生成器，每次产生一个行字典列表
+        """
+        if table_name not in self.table_names:
+            print(f"{table_name} table does not exist")
+            return
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"SELECT * FROM {table_name} ORDER BY id")
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield self.rows_to_dicts(cur, rows)
+        finally:
+            cur.close()
+
+    def get_rows_page(self, table_name, columns=None, order_by="id", descending=False, after=None, limit=None):
+        """
+        分页获取表中的行，列的选择、排序、游标和行数限制都在 SQL 中完成。
+
+        :param table_name: 表名
+        :param columns: 需要的列名列表，为空时返回所有列
+        :param order_by: 排序列名，相同值的行再按 id 排序
+        :param descending: 是否降序
+        :param after: 游标，上一页最后一行的 (order_by 列的值, id)，为空时从第一行开始
+        :param limit: 最多返回的行数，为空时不限制
+        :return: 字典列表；表不存在时返回 None；列名不存在时抛出 ValueError
+        """
+        table_columns = self.get_table_schema(table_name)
+        if not table_columns:
+            print(f"Database.get_rows_page: Table '{table_name}' does not exist")
+            return None
+
+        columns = tuple(columns) if columns else tuple(table_columns)
+        unknown_columns = [col for col in columns + (order_by,) if col not in table_columns]
+        if unknown_columns:
+            raise ValueError(f"Unknown columns {', '.join(unknown_columns)} in table '{table_name}'")
+
+        params = []
+        cursor_kind = None
+        if after is not None:
+            order_value, row_id = after
+            cursor_kind = "null" if order_value is None else "value"
+            if order_by == "id" or order_value is None:
+                params.append(row_id)
+            else:
+                params.extend([order_value, row_id])
+        if limit is not None:
+            params.append(limit)
+
+        query = self.build_page_statement(table_name, columns, order_by, descending, cursor_kind, limit is not None)
+        cur = self.conn.cursor()
+        cur.execute(query, params)
+        result = self.rows_to_dicts(cur, cur.fetchall())
+        cur.close()
+        return result
+
     def get_row(self, table_name: str, query_dict: dict):
         """
         根据查询条件获取表中的行。
@@ -57,19 +542,16 @@ class Database:
         :param query_dict: 包含查询条件的字典，键为列名，值为查询值
         :return: 包含匹配行的字典或字典列表
         """
-        cur = self.conn.cursor()
-        cur.execute(f"PRAGMA table_info({table_name})")
-        columns_info = [col[1] for col in cur.fetchall()]
+        columns_info = self.get_table_schema(table_name)
 
         # 检查查询条件中的列是否存在于表中
         for column in query_dict.keys():
             if column not in columns_info:
                 print(f"Query column '{column}' does not exist in table '{table_name}'")
-                cur.close()
                 return None
 
-        condition_clause = ' AND '.join([f"{col} = ?" for col in query_dict.keys()])
-        query = f"SELECT * FROM {table_name} WHERE {condition_clause}"
+        cur = self.conn.cursor()
+        query = self.build_statement("select", table_name, condition_columns=tuple(query_dict.keys()))
         cur.execute(query, list(query_dict.values()))
         rows = cur.fetchall()
 
@@ -90,83 +572,265 @@ class Database:
         :param table_name: 表名
         :param values: 插入的值，不包括 ID 列的值
         """
-        cur = self.conn.cursor()
-        cur.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cur.fetchall()
+        columns_info = self.get_table_schema(table_name)
         columns_count = len(columns_info)  # 包括id列
 
         # 检查传递的值数量是否正确
         if len(values) != (columns_count - 1):  # 减去id列
             print(f"Not matched! number of values should be {columns_count - 1}!")
-            cur.close()
             return
 
-        # 获取最后一个 ID 值并自增
-        cur.execute(f"SELECT MAX(id) FROM {table_name}")
-        last_id = cur.fetchone()[0]
-        new_id = last_id + 1 if last_id is not None else 1
-
-        placeholders = ', '.join(['?'] * (columns_count - 1))
-        row = f"INSERT INTO {table_name} (id, {', '.join([col[1] for col in columns_info if col[1] != 'id'])}) VALUES ({new_id}, {placeholders})"
+        # ID 由 SQLite 在现有最大 ID 的基础上自增
+        cur = self.conn.cursor()
+        row = self.build_statement("insert", table_name, tuple(col for col in columns_info if col != 'id'))
         cur.execute(row, values)
-        self.conn.commit()
+        self.commit()
         cur.close()
 
-    def update_row(self, table_name: str, set_dict: dict, condition_dict: dict):
+    def add_rows(self, table_name, columns, rows, conflict_columns=None, update_columns=None, return_rows=False):
+        """
+        在一个事务中向指定表批量添加多行数据。ID 列由 SQLite 自动分配（在现有最大 ID 的基础上自增）。
+        如果指定了 conflict_columns，则与已有行在这些列上冲突的行会被跳过，或者在指定了 update_columns 时更新这些列。
+
+        :param table_name: 表名
+        :param columns: 插入的列名列表，不包括 ID 列
+        :param rows: 每一行的值列表，顺序与 columns 一致
+        :param conflict_columns: 唯一索引的列名列表，需要表中存在对应的唯一索引
+        :param update_columns: 冲突时需要更新的列名列表
+        :param return_rows: 是否同时返回被插入和被更新的行，为 True 时逐行执行 RETURNING 语句
+        :return: 包含 inserted、skipped、updated 行数的字典，return_rows 为 True 时
+                 还包含 inserted_rows 和 updated_rows 两个字典列表
+        """
+        rows = list(rows)
+        counts = {"inserted": 0, "skipped": 0, "updated": 0}
+        if not rows:
+            return counts
+
+        if conflict_columns:
+            query = self.build_statement("upsert", table_name, tuple(columns),
+                                         conflict_columns=tuple(conflict_columns),
+                                         update_columns=tuple(update_columns or ()), returning=return_rows)
+        else:
+            query = self.build_statement("insert", table_name, tuple(columns), returning=return_rows)
+
+        cur = self.conn.cursor()
+        try:
+            # 事务立即获取写锁，保证事务内新插入的行就是 ID 大于插入前最大 ID 的行
+            with self.transaction():
+                cur.execute(f"SELECT MAX(id) FROM {table_name}")
+                last_id = cur.fetchone()[0] or 0
+
+                # 只统计语句本身写入的行：total_changes 还包括触发器（如全文索引的同步触发器）写入的行
+                if return_rows:
+                    # RETURNING 不能与 executemany 一起使用，在同一个事务中逐行执行
+                    written_rows = []
+                    for row in rows:
+                        cur.execute(query, row)
+                        written_rows.extend(self.rows_to_dicts(cur, cur.fetchall()))
+                    counts["inserted_rows"] = [row for row in written_rows if row["id"] > last_id]
+                    counts["updated_rows"] = [row for row in written_rows if row["id"] <= last_id]
+                    changes = len(written_rows)
+                else:
+                    cur.executemany(query, rows)
+                    changes = cur.rowcount
+                cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE id > ?", (last_id,))
+                counts["inserted"] = cur.fetchone()[0]
+                counts["updated"] = changes - counts["inserted"]
+                counts["skipped"] = len(rows) - changes
+        except sqlite3.Error as e:
+            print(f"Database.add_rows: Failed to insert rows into table '{table_name}': {e}")
+            counts = {"inserted": 0, "skipped": len(rows), "updated": 0}
+            if return_rows:
+                counts.update({"inserted_rows": [], "updated_rows": []})
+            return counts
+        finally:
+            cur.close()
+        return counts
+
+    def update_row(self, table_name: str, set_dict: dict, condition_dict: dict, return_rows=False):
         """
         更新指定表中符合条件的行。
 
         :param table_name: 表名
         :param set_dict: 包含需要更新的字段及其对应值的字典
         :param condition_dict: 包含作为查询条件的字段及其对应值的字典
+        :param return_rows: 是否返回被更新的行
+        :return: 被更新的行数，return_rows 为 True 时返回更新后的行（字典）列表
         """
-        cur = self.conn.cursor()
-        cur.execute(f"PRAGMA table_info({table_name})")
-        columns_info = [col[1] for col in cur.fetchall()]
+        columns_info = self.get_table_schema(table_name)
 
         # 过滤 set_dict 中不存在的列
         valid_set_dict = {col: val for col, val in set_dict.items() if col in columns_info}
         if not valid_set_dict:
             print(f"Database.update_row: No valid set columns exist in table '{table_name}'")
-            cur.close()
+            return
+
+        if not condition_dict:
+            print(f"Database.update_row: No condition provided for table '{table_name}'")
             return
 
         # 检查 condition_dict 中的列是否存在于表中
         for column in condition_dict.keys():
             if column not in columns_info:
                 print(f"Condition column '{column}' does not exist in table '{table_name}'")
-                cur.close()
                 return
 
-        set_clause = ', '.join([f"{col} = ?" for col in valid_set_dict.keys()])
-        condition_clause = ' AND '.join([f"{col} = ?" for col in condition_dict.keys()])
-
-        query = f"UPDATE {table_name} SET {set_clause} WHERE {condition_clause}"
+        cur = self.conn.cursor()
+        query = self.build_statement("update", table_name, tuple(valid_set_dict.keys()), tuple(condition_dict.keys()),
+                                     returning=return_rows)
         values = list(valid_set_dict.values()) + list(condition_dict.values())
         cur.execute(query, values)
-        self.conn.commit()
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
+        cur.close()
+        return result
+
+    def toggle_column(self, table_name: str, column_name: str, condition_dict: dict, return_rows=False):
+        """
+        把指定表中符合条件的行的布尔列取反（0 变为 1，1 变为 0），读取和修改在同一条语句中完成。
+
+        :param table_name: 表名
+        :param column_name: 需要取反的列名
+        :param condition_dict: 包含作为查询条件的字段及其对应值的字典
+        :param return_rows: 是否返回被更新的行
+        :return: 被更新的行数，return_rows 为 True 时返回更新后的行（字典）列表
+        """
+        columns_info = self.get_table_schema(table_name)
+        if column_name not in columns_info:
+            print(f"Database.toggle_column: Column '{column_name}' does not exist in table '{table_name}'")
+            return
+        if not condition_dict:
+            print(f"Database.toggle_column: No condition provided for table '{table_name}'")
+            return
+        for column in condition_dict.keys():
+            if column not in columns_info:
+                print(f"Condition column '{column}' does not exist in table '{table_name}'")
+                return
+
+        cur = self.conn.cursor()
+        query = self.build_statement("toggle", table_name, (column_name,), tuple(condition_dict.keys()),
+                                     returning=return_rows)
+        cur.execute(query, list(condition_dict.values()))
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
         cur.close()
+        return result
 
-    def delete_row(self, table_name, condition_column, condition_value):
+    def set_column_values(self, table_name: str, column_name: str, value, key_column=None, key_values=None,
+                          return_rows=False, only_true=False):
+        """
+        把指定表中多行的某一列设置为同一个值，只修改值不同的行，在一条语句中完成。
+
+        :param table_name: 表名
+        :param column_name: 需要设置的列名
+        :param value: 新的值
+        :param key_column: 定位行的列名，为空时修改所有行
+        :param key_values: key_column 的值列表，作为一个 JSON 数组参数传入
+        :param return_rows: 是否返回被更新的行
+        :param only_true: 是否只修改该列当前为真的行，为 NULL 或 0 的行不会被修改
+        :return: 被更新的行数，return_rows 为 True 时返回更新后的行（字典）列表
+        """
+        columns_info = self.get_table_schema(table_name)
+        for column in (column_name, key_column):
+            if column is not None and column not in columns_info:
+                print(f"Database.set_column_values: Column '{column}' does not exist in table '{table_name}'")
+                return
+
+        query = f"UPDATE {table_name} SET {column_name} = ? WHERE {column_name} IS NOT ?"
+        params = [value, value]
+        if only_true:
+            query += f" AND {column_name}"
+        if key_column is not None:
+            query += f" AND {key_column} IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(key_values or ())))
+        if return_rows:
+            query += " RETURNING *"
+
+        cur = self.conn.cursor()
+        cur.execute(query, params)
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
+        cur.close()
+        return result
+
+    def delete_row(self, table_name, condition_column, condition_value, return_rows=False):
         """
         删除指定表中符合条件的行。
 
         :param table_name: 表名
         :param condition_column: 条件列名
         :param condition_value: 条件值
+        :param return_rows: 是否返回被删除的行
+        :return: 被删除的行数，return_rows 为 True 时返回被删除的行（字典）列表
         """
         cur = self.conn.cursor()
-        query = f"DELETE FROM {table_name} WHERE {condition_column} = ?"
+        query = self.build_statement("delete", table_name, condition_columns=(condition_column,), returning=return_rows)
         cur.execute(query, (condition_value,))
-        self.conn.commit()
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
+        cur.close()
+        return result
+
+    def build_contains_condition(self, table_name, column_name, column_value_contained):
+        """
+        生成“列值包含子字符串”的 WHERE 条件，参数为 LIKE 模式 %子字符串%。
+        如果该列建立了 trigram 索引（索引表为 <表名>_trigram）、子字符串不少于3个字符，并且在表的前 substring_sample_size 行中
+        匹配的比例不超过 substring_index_max_ratio，则通过索引找到候选行，否则逐行比较。两种方式的匹配结果相同。
+        行数少于 substring_sample_size 的表总是逐行比较。
+
+        :param table_name: 表名
+        :param column_name: 条件列名
+        :param column_value_contained: 条件列的值所包含的子字符串
+        :return: (WHERE 条件, LIKE 模式)
+        """
+        pattern = '%' + column_value_contained + '%'
+        index_name = f"{table_name}_trigram"
+        # trigram 索引只能加速包含至少一个完整三字符组的模式
+        if len(column_value_contained) >= 3 and column_name in self.get_table_schema(index_name):
+            cur = self.conn.cursor()
+            cur.execute(f"SELECT COUNT(*), COUNT(CASE WHEN {column_name} LIKE ? THEN 1 END) "
+                        f"FROM (SELECT {column_name} FROM {table_name} LIMIT ?)", (pattern, self.substring_sample_size))
+            sampled_count, matched_count = cur.fetchone()
+            cur.close()
+            if (sampled_count == self.substring_sample_size
+                    and matched_count <= sampled_count * self.substring_index_max_ratio):
+                return f"id IN (SELECT rowid FROM {index_name} WHERE {column_name} LIKE ?)", pattern
+        return f"{column_name} LIKE ?", pattern
+
+    def get_rows_within_value(self, table_name, column_name, column_value_contained, limit=None):
+        """
+        获取指定表中列值包含特定子字符串的行，按 id 排序。
+
+        :param table_name: 表名
+        :param column_name: 条件列名
+        :param column_value_contained: 条件列的值所包含的子字符串
+        :param limit: 最多返回的行数，为空时返回所有匹配的行
+        :return: 行字典列表，列不存在时返回 None
+        """
+        if column_name not in self.get_table_schema(table_name):
+            print(f"Database.get_rows_within_value: Column '{column_name}' does not exist in table '{table_name}'")
+            return None
+
+        condition, pattern = self.build_contains_condition(table_name, column_name, column_value_contained)
+        query = f"SELECT * FROM {table_name} WHERE {condition} ORDER BY id"
+        params = [pattern]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        cur = self.conn.cursor()
+        cur.execute(query, params)
+        result = self.rows_to_dicts(cur, cur.fetchall())
         cur.close()
+        return result
 
-    def delete_row_within_value(self, table_name, column_name, column_value_contained):
+    def delete_row_within_value(self, table_name, column_name, column_value_contained, return_rows=False):
         """
         删除指定表中列值包含特定子字符串的行。
         :param table_name: 表名
         :param column_name: 条件列名
         :param column_value_contained: 条件列的值所包含的子字符串
+        :param return_rows: 是否返回被删除的行
+        :return: 被删除的行数，return_rows 为 True 时返回被删除的行（字典）列表
         """
         cur = self.conn.cursor()
         if table_name not in self.table_names:
@@ -174,73 +838,246 @@ class Database:
             cur.close()
             return
 
-        query = f"DELETE FROM {table_name} WHERE {column_name} LIKE ?"
-        cur.execute(query, ('%' + column_value_contained + '%',))
-        self.conn.commit()
+        condition, pattern = self.build_contains_condition(table_name, column_name, column_value_contained)
+        query = f"DELETE FROM {table_name} WHERE {condition}"
+        if return_rows:
+            query += " RETURNING *"
+        cur.execute(query, (pattern,))
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
         cur.close()
-        return
+        return result
 
-    def delete_row_by_conditions(self, table_name: str, conditions: dict):
+    def delete_row_by_conditions(self, table_name: str, conditions: dict, return_rows=False):
         """
         删除指定表中符合所有条件的行。
         :param table_name: 表名
         :param conditions: 包含作为查询条件的字段及其对应值的字典
+        :param return_rows: 是否返回被删除的行
+        :return: 被删除的行数，return_rows 为 True 时返回被删除的行（字典）列表
         """
-        cur = self.conn.cursor()
         if table_name not in self.table_names:
             print(f"{table_name} does not exist!")
-            cur.close()
             return
 
         # 获取表中的列信息
-        cur.execute(f"PRAGMA table_info({table_name})")
-        columns_info = [col[1] for col in cur.fetchall()]
+        columns_info = self.get_table_schema(table_name)
 
         # 检查条件字典中的列是否存在于表中
         valid_conditions = {col: val for col, val in conditions.items() if col in columns_info}
         if not valid_conditions:
             print(f"Database.delete_row_by_conditions: No valid condition columns exist in table '{table_name}'")
-            cur.close()
             return
 
-        condition_clause = ' AND '.join([f"{col} = ?" for col in valid_conditions.keys()])
-
-        query = f"DELETE FROM {table_name} WHERE {condition_clause}"
+        cur = self.conn.cursor()
+        query = self.build_statement("delete", table_name, condition_columns=tuple(valid_conditions.keys()),
+                                     returning=return_rows)
         values = list(valid_conditions.values())
         cur.execute(query, values)
-        self.conn.commit()
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
         cur.close()
+        return result
 
-    def delete_all_rows(self, table_name):
+    def delete_all_rows(self, table_name, return_rows=False):
         """
         删除指定表中的所有数据。
         :param table_name: 表名
+        :param return_rows: 是否返回被删除的行
+        :return: 被删除的行数，return_rows 为 True 时返回被删除的行（字典）列表
         """
         cur = self.conn.cursor()
-        query = f"DELETE FROM {table_name}"
+        query = self.build_statement("delete", table_name, returning=return_rows)
         cur.execute(query)
-        self.conn.commit()
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
         cur.close()
+        return result
 
-    def create_table(self, table_name, **columns):
+    def create_table(self, table_name, storage="disk", **columns):
         """
         创建新表。
         :param table_name: 表名
+        :param storage: 存储方式，storage_schemas 中的键，默认为 disk
         :param columns: 列定义，格式为 column_name=type
         """
+        schema = self.storage_schemas[storage]
         cur = self.conn.cursor()
         columns_definition = 'id INTEGER PRIMARY KEY'  # 默认添加id列
         for column_name, column_type in columns.items():
             columns_definition += f", {column_name} {column_type}"
-        create_table_sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_definition})"
+        create_table_sql = f"CREATE TABLE IF NOT EXISTS {schema}.{table_name} ({columns_definition})"
         cur.execute(create_table_sql)
-        self.conn.commit()
+
+        # 数据库文件中的同名表（旧版本创建）会遮蔽内存数据库中的表，把其中的行移入新表后删除
+        if schema != "main":
+            cur.execute(f"PRAGMA main.table_info({table_name})")
+            old_columns = [info[1] for info in cur.fetchall()]
+            if old_columns:
+                copy_columns = ", ".join(col for col in old_columns if col == "id" or col in columns)
+                cur.execute(f"INSERT OR IGNORE INTO {schema}.{table_name} ({copy_columns}) "
+                            f"SELECT {copy_columns} FROM main.{table_name}")
+                cur.execute(f"DROP TABLE main.{table_name}")
+        self.commit()
         cur.close()
+        self.invalidate_schema_cache(table_name)
 
         # 更新table_names列表
         if table_name not in self.table_names:
             self.table_names.append(table_name)
 
+    def create_index(self, table_name, columns, unique=False, index_name=None, storage="disk"):
+        """
+        为指定表创建索引，索引已存在时不做任何操作。
+
+        :param table_name: 表名
+        :param columns: 索引包含的列名列表
+        :param unique: 是否为唯一索引
+        :param index_name: 索引名称，默认为 idx_<表名>_<列名>
+        :param storage: 表的存储方式，与创建表时相同
+        :return: 创建成功返回 True，否则返回 False
+        """
+        if index_name is None:
+            index_name = f"idx_{table_name}_{'_'.join(columns)}"
+        unique_clause = "UNIQUE " if unique else ""
+        schema = self.storage_schemas[storage]
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"CREATE {unique_clause}INDEX IF NOT EXISTS {schema}.{index_name} "
+                        f"ON {table_name} ({', '.join(columns)})")
+            self.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"Database.create_index: Failed to create index '{index_name}' on table '{table_name}': {e}")
+            return False
+        finally:
+            cur.close()
+        return True
+
+    def create_fulltext_index(self, table_name, columns, index_name=None, tokenizer="unicode61", storage="disk",
+                              options=""):
+        """
+        为指定表建立 FTS5 全文索引，并创建触发器使索引随表的插入、修改和删除同步更新。
+        索引表是 external content 表，只保存索引，文本仍从原表读取。
+        索引已存在且列相同时不做任何操作；新建或列发生变化时根据表中现有的行重建索引。
+
+        :param table_name: 表名
+        :param columns: 建立索引的文本列名列表
+        :param index_name: 索引表名称，默认为 <表名>_fts
+        :param tokenizer: FTS5 分词器，如 unicode61 或 trigram
+        :param storage: 表的存储方式，与创建表时相同
+        :param options: 其他 FTS5 选项，如 "detail=none, columnsize=0"
+        :return: 创建成功返回 True，否则返回 False（如 SQLite 不支持 FTS5）
+        """
+        if index_name is None:
+            index_name = f"{table_name}_fts"
+        schema = self.storage_schemas[storage]
+        columns = list(columns)
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{col}" for col in columns)
+        old_values = ", ".join(f"old.{col}" for col in columns)
+        insert_new = f"INSERT INTO {index_name}(rowid, {column_list}) VALUES (new.id, {new_values});"
+        delete_old = (f"INSERT INTO {index_name}({index_name}, rowid, {column_list}) "
+                      f"VALUES ('delete', old.id, {old_values});")
+
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"PRAGMA {schema}.table_info({index_name})")
+            if [info[1] for info in cur.fetchall()] == columns:
+                return True
+            with self.transaction():
+                cur.execute(f"DROP TABLE IF EXISTS {schema}.{index_name}")
+                cur.execute(f"CREATE VIRTUAL TABLE {schema}.{index_name} USING fts5({column_list}, "
+                            f"content='{table_name}', content_rowid='id', tokenize='{tokenizer}'"
+                            f"{', ' + options if options else ''})")
+                triggers = {
+                    "ai": ("AFTER INSERT", insert_new),
+                    "ad": ("AFTER DELETE", delete_old),
+                    # 只修改其他列（如 date）时不需要更新索引
+                    "au": (f"AFTER UPDATE OF id, {column_list}", delete_old + " " + insert_new),
+                }
+                for suffix, (event, body) in triggers.items():
+                    cur.execute(f"DROP TRIGGER IF EXISTS {schema}.{index_name}_{suffix}")
+                    cur.execute(f"CREATE TRIGGER {schema}.{index_name}_{suffix} {event} ON {table_name} "
+                                f"BEGIN {body} END")
+                cur.execute(f"INSERT INTO {index_name}({index_name}) VALUES ('rebuild')")
+        except sqlite3.Error as e:
+            print(f"Database.create_fulltext_index: Failed to create index '{index_name}' on table '{table_name}': {e}")
+            return False
+        finally:
+            cur.close()
+        # 索引的列可能发生了变化，build_contains_condition 根据索引的列决定是否使用索引
+        self.invalidate_schema_cache(index_name)
+        return True
+
+    @staticmethod
+    def build_match_query(text):
+        """
+        把用户输入的搜索文本转换为 FTS5 MATCH 表达式：按空白拆分为词，每个词作为一个短语，词之间为 AND 关系，
+        以 * 结尾的词按前缀匹配。输入中的 AND、OR、引号和括号等不会被当作 FTS5 语法。
+
+        :param text: 搜索文本
+        :return: MATCH 表达式，没有可以搜索的词时返回空字符串
+        """
+        terms = []
+        for word in text.split():
+            prefix = "*" if word.endswith("*") else ""
+            word = word.rstrip("*")
+            if word:
+                terms.append('"' + word.replace('"', '""') + '"' + prefix)
+        return " ".join(terms)
+
+    def search_fulltext(self, table_name, text, index_name=None, limit=20, offset=0, highlight=("[", "]"),
+                        snippet_tokens=10):
+        """
+        在全文索引中搜索，结果按 bm25 相关度排序，越相关越靠前，相关度相同时按 id 排序。
+
+        :param table_name: 表名
+        :param text: 搜索文本，格式见 build_match_query
+        :param index_name: 索引表名称，默认为 <表名>_fts
+        :param limit: 最多返回的行数
+        :param offset: 跳过的行数
+        :param highlight: 在文本片段中标记匹配词的 (开始标记, 结束标记)
+        :param snippet_tokens: 文本片段最多包含的词数
+        :return: 行字典列表，除表中的所有列外包括 rank（bm25 分数，越小越相关）和 snippet（匹配处附近的文本片段）；
+                 没有可以搜索的词时返回空列表，索引不存在时返回 None
+        """
+        match_query = self.build_match_query(text)
+        if not match_query:
+            return []
+        if index_name is None:
+            index_name = f"{table_name}_fts"
+
+        query = (f"SELECT {table_name}.*, snippet({index_name}, -1, ?, ?, '…', ?) AS snippet, "
+                 f"{index_name}.rank AS rank FROM {index_name} JOIN {table_name} ON {table_name}.id = {index_name}.rowid "
+                 f"WHERE {index_name} MATCH ? ORDER BY {index_name}.rank, {table_name}.id LIMIT ? OFFSET ?")
+        cur = self.conn.cursor()
+        try:
+            cur.execute(query, (highlight[0], highlight[1], snippet_tokens, match_query, limit, offset))
+            return self.rows_to_dicts(cur, cur.fetchall())
+        except sqlite3.OperationalError as e:
+            print(f"Database.search_fulltext: Failed to search index '{index_name}' of table '{table_name}': {e}")
+            return None
+        finally:
+            cur.close()
+
+    def delete_duplicate_rows(self, table_name, columns):
+        """
+        删除指定表中在给定列上重复的行，每组重复行只保留 ID 最小的一行。
+
+        :param table_name: 表名
+        :param columns: 判断重复的列名列表
+        :return: 删除的行数
+        """
+        cur = self.conn.cursor()
+        query = (f"DELETE FROM {table_name} WHERE id NOT IN "
+                 f"(SELECT MIN(id) FROM {table_name} GROUP BY {', '.join(columns)})")
+        cur.execute(query)
+        deleted_count = cur.rowcount
+        self.commit()
+        cur.close()
+        return deleted_count
+
     def get_row_by_column_value(self, table_name, column_name, column_value):
         """
         根据列名和值获取行数据。
@@ -255,7 +1092,7 @@ class Database:
             cur.close()
             return None
 
-        query = f"SELECT * FROM {table_name} WHERE {column_name} = ?"
+        query = self.build_statement("select", table_name, condition_columns=(column_name,))
         cur.execute(query, (column_value,))
         row = cur.fetchone()
         if row:
@@ -266,6 +1103,25 @@ class Database:
             cur.close()
             return None
 
+    def get_existing_values(self, table_name, column_name, values):
+        """
+        检查一组值中哪些已经存在于指定列中，所有值作为一个 JSON 数组参数在一条语句中查询。
+
+        :param table_name: 表名
+        :param column_name: 列名
+        :param values: 需要检查的值列表
+        :return: 已存在的值的集合
+        """
+        values = list(values)
+        if not values:
+            return set()
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT DISTINCT {column_name} FROM {table_name} "
+                    f"WHERE {column_name} IN (SELECT value FROM json_each(?))", (json.dumps(values),))
+        existing_values = {row[0] for row in cur.fetchall()}
+        cur.close()
+        return existing_values
+
     def join_tables(self, table1, table2, join_type, join_condition, columns='*'):
         """
         连接两个表。
@@ -288,6 +1144,39 @@ class Database:
         cur.close()
         return rows
 
+    def sync_column(self, target_table, source_table, updated_key, condition_keys, return_rows=False):
+        """
+        用一条关联更新语句，把 source_table 中 updated_key 列的值同步到 target_table 中
+        condition_keys 列的值都相同且 updated_key 列的值不同的行。
+
+        :param target_table: 被更新的表名
+        :param source_table: 作为标准的表名
+        :param updated_key: 需要同步的列名
+        :param condition_keys: 用于匹配两个表中行的列名列表
+        :param return_rows: 是否返回被更新的行
+        :return: 被更新的行数，return_rows 为 True 时返回更新后的行（字典）列表
+        """
+        target_columns = self.get_table_schema(target_table)
+        source_columns = self.get_table_schema(source_table)
+        condition_keys = [key for key in condition_keys if key in target_columns and key in source_columns]
+        if updated_key not in target_columns or updated_key not in source_columns or not condition_keys:
+            print(f"Database.sync_column: No valid columns to sync between '{target_table}' and '{source_table}'")
+            return [] if return_rows else 0
+
+        match_clause = ' AND '.join([f"source.{key} IS {target_table}.{key}" for key in condition_keys])
+        query = (f"UPDATE {target_table} SET {updated_key} = "
+                 f"(SELECT source.{updated_key} FROM {source_table} AS source WHERE {match_clause}) "
+                 f"WHERE EXISTS (SELECT 1 FROM {source_table} AS source WHERE {match_clause} "
+                 f"AND source.{updated_key} IS NOT {target_table}.{updated_key})")
+        if return_rows:
+            query += " RETURNING *"
+        cur = self.conn.cursor()
+        cur.execute(query)
+        result = self.rows_to_dicts(cur, cur.fetchall()) if return_rows else cur.rowcount
+        self.commit()
+        cur.close()
+        return result
+
     def get_last_row_id(self, table_name):
         """
         获取指定表中最后插入行的ID。
@@ -324,16 +1213,111 @@ class Database:
             cur.close()
             return None
 
-        query = f"SELECT {column_name} FROM {table_name}"
+        # 在数据库中求和，不读取行；与 int() 一样把每个值截断为整数，NULL 不计入
+        query = f"SELECT COALESCE(SUM(CAST({column_name} AS INTEGER)), 0) FROM {table_name}"
         cur.execute(query)
-        rows = cur.fetchall()
-        total_sum = sum(int(row[0]) for row in rows)
+        total_sum = cur.fetchone()[0]
         cur.close()
         return total_sum
 
+    def count_rows(self, table_name, condition_dict=None):
+        """
+        在数据库中统计指定表中符合条件的行数，不读取行。
+
+        :param table_name: 表名
+        :param condition_dict: 包含作为查询条件的字段及其对应值的字典，条件之间为 AND 关系，为空时统计所有行
+        :return: 行数，表或条件列不存在时返回 None
+        """
+        columns_info = self.get_table_schema(table_name)
+        if not columns_info:
+            print(f"{table_name} does not exist!")
+            return None
+        condition_dict = condition_dict or {}
+        for column in condition_dict.keys():
+            if column not in columns_info:
+                print(f"Condition column '{column}' does not exist in table '{table_name}'")
+                return None
+
+        cur = self.conn.cursor()
+        cur.execute(self.build_statement("count", table_name, condition_columns=tuple(condition_dict.keys())),
+                    list(condition_dict.values()))
+        count = cur.fetchone()[0]
+        cur.close()
+        return count
+
+    def count_rows_by(self, table_name, column_name):
+        """
+        在数据库中按指定列的值分组统计行数，不读取行。
+
+        :param table_name: 表名
+        :param column_name: 分组的列名
+        :return: 字典，键为列的值，值为行数；列不存在时返回 None
+        """
+        if column_name not in self.get_table_schema(table_name):
+            print(f"Database.count_rows_by: Column '{column_name}' does not exist in table '{table_name}'")
+            return None
+
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT {column_name}, COUNT(*) FROM {table_name} GROUP BY {column_name}")
+        counts = dict(cur.fetchall())
+        cur.close()
+        return counts
+
+    def get_table_size(self, table_name, storage="disk"):
+        """
+        统计指定表及其索引占用的字节数。通过 dbstat 虚拟表读取 B 树的页信息，不读取行。
+
+        :param table_name: 表名
+        :param storage: 表的存储方式，与创建表时相同
+        :return: 字节数，SQLite 不支持 dbstat 时返回 None
+        """
+        schema = self.storage_schemas[storage]
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat(?, 1) "
+                        f"WHERE name IN (SELECT name FROM {schema}.sqlite_master WHERE tbl_name = ?)",
+                        (schema, table_name))
+            return cur.fetchone()[0]
+        except sqlite3.OperationalError as e:
+            print(f"Database.get_table_size: Failed to get the size of table '{table_name}': {e}")
+            return None
+        finally:
+            cur.close()
+
+    def explain_query_plan(self, query, params=()):
+        """
+        获取查询语句的执行计划，可用于检查查询是否使用了索引。
+
+        :param query: SQL 语句
+        :param params: SQL 语句的参数
+        :return: 执行计划中每一步的描述列表，如 'SEARCH current_windows USING INDEX idx_current_windows_hwnd (hwnd=?)'
+        """
+        cur = self.conn.cursor()
+        cur.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        plan = [row[3] for row in cur.fetchall()]
+        cur.close()
+        return plan
+
+    def get_performance_settings(self):
+        """
+        获取当前连接实际生效的性能配置。
+
+        :return: 包含配置名称和各 PRAGMA 当前值的字典
+        """
+        cur = self.conn.cursor()
+        settings = {"profile": self.conn.profile_name}
+        for pragma in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+            cur.execute(f"PRAGMA {pragma}")
+            settings[pragma] = cur.fetchone()[0]
+        cur.close()
+        return settings
+
     def close_connection(self):
         """
-        关闭数据库连接。
+        关闭数据库连接，即将连接归还到连接池。未结束的显式事务会被撤销。
         """
-        self.conn.close()
+        if self.conn is not None:
+            self.pool.release_connection(self.conn)
+            self.conn = None
+            self.transaction_depth = 0
         return
@@ -0,0 +1,215 @@
+import threading
+
+
+class ModelCache:
+    # 所有缓存，键为 (数据库名称, 表名)，同一个表的多个 DataModel 实例共享同一个缓存
+    caches = {}
+    caches_lock = threading.Lock()
+
+    def __init__(self, index_columns=()):
+        """
+        初始化 ModelCache 实例，在内存中保存一个表的所有行，并按 id 和 index_columns 中的列建立索引。
+        缓存由 DataModel 在每次写入后直接更新（写穿），只有通过 DataModel 的写入才会反映到缓存中。
+
+        :param index_columns: 建立索引的列名元组
+        """
+        self.index_columns = tuple(index_columns)
+        self.lock = threading.Lock()
+        # 写入数据库和更新缓存需要在这个锁中完成，保证缓存按照与数据库相同的顺序应用修改
+        self.write_lock = threading.RLock()
+        # 键为 id 的行字典，为 None 时表示缓存尚未加载或已失效
+        self.rows = None
+        self.columns = ()
+        self.indexes = {}
+        # 每次修改或失效时自增，用于丢弃加载期间发生了修改的加载结果
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get_cache(cls, database_name, table_name, index_columns=()):
+        """
+        获取指定表的缓存，不存在时创建。
+
+        :param database_name: 数据库名称
+        :param table_name: 表名
+        :param index_columns: 建立索引的列名元组
+        :return: ModelCache 实例
+        """
+        key = (database_name, table_name)
+        with cls.caches_lock:
+            cache = cls.caches.get(key)
+            if cache is None:
+                cache = cls(index_columns)
+                cls.caches[key] = cache
+            return cache
+
+    @staticmethod
+    def normalize(value):
+        """
+        把值转换为比较时使用的形式，使缓存的匹配结果与 SQLite 按列类型比较的结果一致（如 hwnd 的 1234 与 "1234"）。
+
+        :param value: 值
+        :return: 转换后的值
+        """
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int):
+            return str(value)
+        return value
+
+    def add_row_locked(self, row):
+        """
+        添加一行，调用前需要持有 lock。
+
+        :param row: 行字典
+        """
+        self.rows[row["id"]] = row
+        for column in self.index_columns:
+            self.indexes[column].setdefault(self.normalize(row.get(column)), set()).add(row["id"])
+
+    def remove_row_locked(self, row_id):
+        """
+        删除一行，调用前需要持有 lock。
+
+        :param row_id: 行的 id
+        """
+        row = self.rows.pop(row_id, None)
+        if row is None:
+            return
+        for column in self.index_columns:
+            key = self.normalize(row.get(column))
+            row_ids = self.indexes[column].get(key)
+            if row_ids is not None:
+                row_ids.discard(row_id)
+                if not row_ids:
+                    del self.indexes[column][key]
+
+    def begin_load(self):
+        """
+        开始从数据库加载缓存，在读取数据库之前调用。
+
+        :return: 加载开始时的 generation，传给 finish_load
+        """
+        with self.lock:
+            return self.generation
+
+    def finish_load(self, generation, rows, columns):
+        """
+        用从数据库读取的行填充缓存。如果加载期间缓存被修改过，读取的行可能已经过时，则放弃本次加载。
+
+        :param generation: begin_load 返回的 generation
+        :param rows: 表中的所有行（字典）列表
+        :param columns: 表的列名列表
+        :return: 缓存被填充时返回 True
+        """
+        with self.lock:
+            if generation != self.generation:
+                return False
+            self.rows = {}
+            self.columns = tuple(columns)
+            self.indexes = {column: {} for column in self.index_columns}
+            for row in rows:
+                self.add_row_locked(dict(row))
+            return True
+
+    def invalidate(self):
+        """
+        使缓存失效，下次读取时重新从数据库加载。
+        """
+        with self.lock:
+            self.generation += 1
+            self.rows = None
+
+    def apply(self, operation, rows, columns=None):
+        """
+        把一次写入的结果应用到缓存。
+
+        :param operation: 操作类型，insert、update 或 delete
+        :param rows: 写入后（delete 时为删除前）的行字典列表，为 None 时缓存失效
+        :param columns: update 时被更新的列名列表
+        """
+        with self.lock:
+            self.generation += 1
+            if self.rows is None:
+                return
+            # 修改了 id 时无法找到缓存中对应的旧行，直接使缓存失效
+            if rows is None or (operation == "update" and (columns is None or "id" in columns)):
+                self.rows = None
+                return
+            for row in rows:
+                self.remove_row_locked(row["id"])
+                if operation != "delete":
+                    self.add_row_locked(dict(row))
+
+    def snapshot(self):
+        """
+        获取缓存中的所有行。
+
+        :return: 按 id 排序的行字典列表（副本），缓存未加载时返回 None
+        """
+        with self.lock:
+            if self.rows is None:
+                return None
+            return [dict(self.rows[row_id]) for row_id in sorted(self.rows)]
+
+    def is_loaded(self):
+        """
+        判断缓存是否已经加载。
+
+        :return: 缓存已加载时返回 True
+        """
+        with self.lock:
+            return self.rows is not None
+
+    def find(self, query_dict):
+        """
+        在缓存中查找所有列都与查询条件相等的行。
+
+        :param query_dict: 包含查询条件的字典，键为列名，值为查询值
+        :return: 按 id 排序的行字典列表（副本）；缓存未加载、查询条件为空或包含表中不存在的列时返回 None
+        """
+        with self.lock:
+            if self.rows is None or not query_dict or any(col not in self.columns for col in query_dict):
+                return None
+            # 与 SQL 一致，NULL 不等于任何值
+            if any(value is None for value in query_dict.values()):
+                return []
+            conditions = {col: self.normalize(value) for col, value in query_dict.items()}
+            indexed_column = next((col for col in conditions if col in self.indexes), None)
+            if "id" in conditions:
+                candidate_ids = [int(conditions["id"])] if str(conditions["id"]).lstrip("-").isdigit() else []
+            elif indexed_column is not None:
+                candidate_ids = sorted(self.indexes[indexed_column].get(conditions[indexed_column], ()))
+            else:
+                candidate_ids = sorted(self.rows)
+            return [dict(self.rows[row_id]) for row_id in candidate_ids if row_id in self.rows and
+                    all(self.normalize(self.rows[row_id].get(col)) == value for col, value in conditions.items())]
+
+    def record(self, hit):
+        """
+        记录一次缓存命中或未命中。
+
+        :param hit: 是否命中
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_stats(self):
+        """
+        获取缓存的统计数据。
+
+        :return: 包含 hits、misses、hit_rate、loaded、rows 的字典
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "loaded": self.rows is not None,
+                "rows": len(self.rows) if self.rows is not None else 0,
+            }
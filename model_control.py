@@ -1,4 +1,5 @@
 from data_models import CurrentWindows, AllWindows
+from database import Database
 
 
 class ModelControl:
@@ -17,34 +18,22 @@ class ModelControl:
         统一两个表中指定键的值。如果 current_windows 表和 all_windows 表中
         符合条件的行的 updated_key 值不一样，则将 current_windows 表中
         updated_key 的值更新为 all_windows 表中的值。
+        所有不一致的行由数据库在一条更新语句中完成更新。
 
         :param updated_key: 需要统一的键
         :param condition_keys: 用于查询的键
+        :return: 被更新的行数
         """
-        # 获取 current_windows 和 all_windows 表中的所有行
-        current_windows_rows = self.current_windows.get_model_list()
-        all_windows_rows = self.all_windows.get_model_list()
-
-        # 将结果统一为列表形式，以便处理
-        if isinstance(current_windows_rows, dict):
-            current_windows_rows = [current_windows_rows]
-        if isinstance(all_windows_rows, dict):
-            all_windows_rows = [all_windows_rows]
-
-        # 构建一个 all_windows 表的字典，便于快速查找
-        def get_key_tuple(row, keys):
-            return tuple(row.get(key) for key in keys if key in row)
-
-        all_windows_dict = {get_key_tuple(row, condition_keys): row for row in all_windows_rows}
-
-        for current_row in current_windows_rows:
-            current_key_tuple = get_key_tuple(current_row, condition_keys)
-            if current_key_tuple in all_windows_dict:
-                all_row = all_windows_dict[current_key_tuple]
-                if current_row[updated_key] != all_row[updated_key]:
-                    set_dict = {updated_key: all_row[updated_key]}
-                    condition_dict = {key: current_row[key] for key in condition_keys if key in current_row}
-                    self.current_windows.update_model_row(set_dict, condition_dict)
+        with self.current_windows.writing():
+            collect_rows = self.current_windows.needs_changed_rows()
+            database = Database(self.current_windows.database_name)
+            result = database.sync_column(self.current_windows.model_name, self.all_windows.model_name,
+                                          updated_key, condition_keys, return_rows=collect_rows)
+            database.close_connection()
+
+            if result:
+                self.current_windows.publish_change("update", result if collect_rows else None, [updated_key])
+        return len(result) if collect_rows else result
 
     def update_current_with_all(self, name: str):
         """
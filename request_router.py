@@ -0,0 +1,626 @@
+import gzip
+import json
+import zlib
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse
+from typing import List
+from data_handler import DataHandler
+
+
+class EventStreamBody:
+    # 没有事件时发送心跳注释的间隔（秒），用于保持连接并及时发现断开的客户端
+    heartbeat_interval = 15
+    # 建议客户端断开后重新连接的等待时间（毫秒）
+    retry_milliseconds = 3000
+    # 事件流结束后不保持连接，客户端总是用新的连接重新订阅
+    keep_alive = False
+
+    def __init__(self, subscriber):
+        """
+        初始化 EventStreamBody 实例，把 ChangeSubscriber 收到的事件格式化为 Server-Sent Events 响应体。
+        订阅者需要重新同步时发送 resync 事件并结束响应，客户端应重新获取完整列表后不带 Last-Event-ID 重新连接。
+
+        :param subscriber: ChangeSubscriber 实例
+        """
+        self.subscriber = subscriber
+        self.started = False
+        self.finished = False
+
+    def format_events(self, events, resync) -> bytes:
+        """
+        把事件格式化为 Server-Sent Events 文本。
+
+        :param events: 事件列表
+        :param resync: 是否需要重新同步
+        :return: 响应体片段
+        """
+        chunk = "".join(f"id: {event['id']}\nevent: {event['operation']}\n"
+                        f"data: {json.dumps(event['row'], ensure_ascii=False)}\n\n" for event in events)
+        if resync:
+            chunk += "event: resync\ndata: {}\n\n"
+            self.finished = True
+        return chunk.encode()
+
+    def heartbeat_chunk(self) -> bytes:
+        """
+        :return: 心跳注释
+        """
+        return b": heartbeat\n\n"
+
+    def poll_chunk(self):
+        """
+        获取下一个响应体片段，不阻塞。
+
+        :return: 响应体片段，暂时没有新事件时返回 None，响应结束时返回空字节串
+        """
+        if not self.started:
+            self.started = True
+            return f"retry: {self.retry_milliseconds}\n\n".encode()
+        events, resync = self.subscriber.poll()
+        if events or resync:
+            return self.format_events(events, resync)
+        if self.subscriber.closed:
+            self.finished = True
+            return b""
+        return None
+
+    def set_waker(self, waker):
+        """
+        设置有新事件时调用的回调函数。
+
+        :param waker: 无参数的回调函数
+        """
+        self.subscriber.set_waker(waker)
+
+    def __iter__(self):
+        while not self.finished:
+            chunk = self.poll_chunk()
+            if chunk is None:
+                events, resync = self.subscriber.wait(self.heartbeat_interval)
+                if events or resync:
+                    chunk = self.format_events(events, resync)
+                elif self.subscriber.closed:
+                    self.finished = True
+                    chunk = b""
+                else:
+                    chunk = self.heartbeat_chunk()
+            if chunk:
+                yield chunk
+
+    def close(self):
+        """
+        结束响应并取消订阅。
+        """
+        self.finished = True
+        self.subscriber.close()
+
+
+class RequestRouter:
+    # API 的根路径
+    base_url = "/SetWindowsTopAPI"
+    # 响应体小于该字节数时不压缩
+    compression_min_size = 1024
+    # gzip 和 deflate 的压缩级别，JSON 在级别 1 时已经能压缩到十分之一左右，更高的级别收益很小但耗时成倍增加
+    compression_level = 1
+    # 列表响应不超过该字节数时一次性返回，超过时以分块传输编码流式返回
+    stream_threshold = 65536
+    # 列表请求的分页参数，带有其中任意一个时返回分页格式的响应
+    page_parameters = ("limit", "cursor", "after_id", "order_by", "fields")
+
+    def __init__(self, handlers: List[DataHandler]):
+        """
+        初始化 RequestRouter 实例。
+        RequestRouter 根据请求的方法和路径调用相应的 DataHandler，并返回响应，不依赖具体的服务器实现，
+        因此 ServerControl 的各种服务模式都使用同一套路由。
+
+        :param handlers: 包含多个 DataHandler 的列表
+        """
+        self.handlers = handlers
+        self.handlers_dict = {f"{self.base_url}{handler.url}": handler for handler in handlers}
+
+    @staticmethod
+    def json_response(status: int, data, headers: dict = None):
+        """
+        生成 JSON 响应。
+
+        :param status: HTTP 状态码
+        :param data: JSON 字符串，或者可以被序列化为 JSON 的对象
+        :param headers: 额外的响应头
+        :return: (状态码, 响应头字典, 响应体字节串)
+        """
+        if not isinstance(data, str):
+            data = DataHandler.to_json(data)
+        response_headers = {"Content-type": "application/json"}
+        if headers:
+            response_headers.update(headers)
+        return status, response_headers, data.encode()
+
+    @staticmethod
+    def parse_json_body(body: bytes):
+        """
+        解析 JSON 请求体。
+
+        :param body: 请求体字节串
+        :return: 解析得到的对象，请求体为空时返回空字典，格式错误时返回 None
+        """
+        if not body:
+            return {}
+        try:
+            return json.loads(body.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+
+    @staticmethod
+    def is_not_modified(headers, etag: str) -> bool:
+        """
+        检查客户端的 If-None-Match 请求头是否与当前 ETag 相同。
+
+        :param headers: 请求头
+        :param etag: 当前 ETag
+        :return: 相同时返回 True
+        """
+        if_none_match = headers.get('If-None-Match') if headers is not None else None
+        if not if_none_match:
+            return False
+        client_etags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in client_etags or etag in client_etags or f"W/{etag}" in client_etags
+
+    @staticmethod
+    def allows_cache(headers) -> bool:
+        """
+        检查客户端是否允许使用服务端的模型表缓存，请求头 Cache-Control 包含 no-cache 时直接读取数据库。
+
+        :param headers: 请求头
+        :return: 允许时返回 True
+        """
+        cache_control = headers.get('Cache-Control') if headers is not None else None
+        return not cache_control or "no-cache" not in cache_control.lower()
+
+    @staticmethod
+    def choose_encoding(accept_encoding: str):
+        """
+        根据 Accept-Encoding 请求头选择压缩方式。
+
+        :param accept_encoding: Accept-Encoding 请求头
+        :return: gzip 或 deflate，客户端不接受压缩时返回 None
+        """
+        preferences = {}
+        for item in (accept_encoding or "").split(","):
+            coding, _, parameters = item.partition(";")
+            quality = 1.0
+            for parameter in parameters.split(";"):
+                name, _, value = parameter.strip().partition("=")
+                if name == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if coding.strip():
+                preferences[coding.strip().lower()] = quality
+
+        encoding, quality = None, 0.0
+        for coding in ("gzip", "deflate"):
+            coding_quality = preferences.get(coding, preferences.get("*", 0.0))
+            if coding_quality > quality:
+                encoding, quality = coding, coding_quality
+        return encoding
+
+    def encode_response(self, request_headers, pretty, status, headers, body):
+        """
+        按客户端的要求转换 JSON 响应：pretty 为 True 时缩进输出，客户端接受时使用 gzip 或 deflate 压缩。
+        转换后的响应与原响应内容相同，ETag 改为弱 ETag。流式的 JSON 响应逐段压缩，缩进输出时合并为一次性的响应。
+
+        :param request_headers: 请求头
+        :param pretty: 是否缩进输出
+        :param status: HTTP 状态码
+        :param headers: 响应头字典
+        :param body: 响应体
+        :return: (状态码, 响应头字典, 响应体)
+        """
+        if headers.get("Content-type") != "application/json":
+            return status, headers, body
+
+        transformed = False
+        if pretty and body:
+            if not isinstance(body, bytes):
+                body = b"".join(body)
+            body = json.dumps(json.loads(body), ensure_ascii=False, indent=4).encode()
+            transformed = True
+
+        headers["Vary"] = "Accept-Encoding"
+        accept_encoding = request_headers.get('Accept-Encoding') if request_headers is not None else None
+        streaming = not isinstance(body, bytes)
+        encoding = None
+        if streaming or len(body) >= self.compression_min_size:
+            encoding = self.choose_encoding(accept_encoding)
+        if encoding and streaming:
+            body = self.compress_chunks(body, encoding, self.compression_level)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=self.compression_level, mtime=0)
+        elif encoding == "deflate":
+            body = zlib.compress(body, self.compression_level)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            transformed = True
+
+        etag = headers.get("ETag")
+        if transformed and etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return status, headers, body
+
+    @staticmethod
+    def compress_chunks(chunks, encoding: str, level: int):
+        """
+        逐段压缩流式响应体。
+
+        :param chunks: 逐段产生字节串的可迭代对象
+        :param encoding: gzip 或 deflate
+        :param level: 压缩级别
+        :return: 生成器，每次产生一段压缩后的字节串
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+        try:
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def buffer_or_stream(self, chunks):
+        """
+        读取响应体的前几段，总长度不超过 stream_threshold 时合并为字节串，否则返回流式响应体。
+
+        :param chunks: 逐段产生字节串的生成器
+        :return: 字节串，或者逐段产生字节串的生成器
+        """
+        buffered = []
+        size = 0
+        for chunk in chunks:
+            buffered.append(chunk)
+            size += len(chunk)
+            if size > self.stream_threshold:
+                return self.chain_chunks(buffered, chunks)
+        return b"".join(buffered)
+
+    @staticmethod
+    def chain_chunks(buffered, chunks):
+        """
+        先产生已经读取的段，再产生剩余的段。
+
+        :param buffered: 已经读取的段列表
+        :param chunks: 剩余的段的生成器
+        :return: 生成器
+        """
+        try:
+            yield from buffered
+            buffered.clear()
+            yield from chunks
+        finally:
+            chunks.close()
+
+    def close_streams(self):
+        """
+        关闭所有变更事件流的订阅，使正在进行的 Server-Sent Events 响应结束，服务器停止时调用。
+        """
+        change_streams = {id(handler.model.change_stream): handler.model.change_stream for handler in self.handlers}
+        for change_stream in change_streams.values():
+            change_stream.close_all_subscribers()
+
+    def close_handlers(self):
+        """
+        写入所有 DataHandler 中等待延迟写入的数据，服务器停止并处理完所有请求后调用。
+        """
+        for handler in self.handlers:
+            handler.close()
+
+    def handle_request(self, method: str, path: str, headers, body: bytes = b""):
+        """
+        处理一个请求。
+
+        :param method: 请求方法，GET 或 POST
+        :param path: 请求路径，包括查询参数
+        :param headers: 请求头，支持 get 方法的映射
+        :param body: 请求体字节串
+        :return: (状态码, 响应头字典, 响应体)，响应体为字节串，或者是逐段产生字节串的可迭代对象（流式响应）
+        """
+        # pretty 参数只影响输出格式，不作为查询条件
+        parsed_path = urlparse(path)
+        query_pairs = parse_qsl(parsed_path.query, keep_blank_values=True)
+        pretty_values = [value for key, value in query_pairs if key == "pretty"]
+        pretty = bool(pretty_values) and pretty_values[-1].lower() not in ("0", "false", "no")
+        if pretty_values:
+            path = parsed_path._replace(query=urlencode([(k, v) for k, v in query_pairs if k != "pretty"])).geturl()
+
+        if method == "GET":
+            response = self.handle_get(path, headers, body)
+        elif method == "POST":
+            response = self.handle_post(path, headers, body)
+        else:
+            response = self.json_response(405, {"error": "Method not allowed"})
+        return self.encode_response(headers, pretty, *response)
+
+    # 处理GET请求
+    def handle_get(self, path, headers, body):
+        parsed_path = urlparse(path)
+        if parsed_path.path == self.base_url:
+            welcome_info = {
+                "message": "Welcome to WindowsSetTopAPI",
+                "API instructions url": "https://github.com/YDDLJW/BJ12SetWindowsTop/blob/main/API%E4%BD%BF"
+                                        "%E7%94"
+                                        "%A8%26%E5%BC%80%E5%8F%91%E6%8C%87%E5%8D%97.md#%E8%8E%B7%E5%8F%96%E7%89"
+                                        "%B9%E5%AE%9A%E5%BD%93%E5%89%8D%E7%AA%97%E5%8F%A3%E4%BF%A1%E6%81%AF",
+                "GET all current windows list": "/SetWindowsTopAPI/current_windows",
+                "GET all past windows list": "/SetWindowsTopAPI/all_windows",
+                "GET or POST(update) certain current windows": "/SetWindowsTopAPI/current_windows/detail",
+                "GET or POST(update) certain past windows": "/SetWindowsTopAPI/all_windows/detail",
+                "POST(toggle) a current window's status of is_set_top": "/SetWindowsTopAPI/current_windows"
+                                                                        "/toggle_set_top",
+                "POST(pause or resume) all current windows' is_set_top": "/SetWindowsTopAPI/current_windows"
+                                                                         "/set_top_all",
+                "POST(batch update, toggle or delete) current windows": "/SetWindowsTopAPI/current_windows/batch",
+                "POST(batch update or delete) past windows": "/SetWindowsTopAPI/all_windows/batch",
+                "GET(full-text search) past windows by name and notes": "/SetWindowsTopAPI/all_windows/search",
+                "GET statistics of current and past windows": "/SetWindowsTopAPI/stats",
+                "GET(Server-Sent Events) changes of current windows": "/SetWindowsTopAPI/current_windows/events",
+                "GET(Server-Sent Events) changes of past windows": "/SetWindowsTopAPI/all_windows/events",
+            }
+            return self.json_response(200, welcome_info)
+        if parsed_path.path == f"{self.base_url}/stats":
+            return self.handle_stats_request()
+        if parsed_path.path.endswith("/detail") and parsed_path.path[:-len("/detail")] in self.handlers_dict:
+            handler = self.handlers_dict[parsed_path.path[:-len("/detail")]]
+            query = parse_qs(parsed_path.query)
+            return self.handle_get_model_detail_request(handler, query, body, headers)
+        if parsed_path.path.endswith("/search") and parsed_path.path[:-len("/search")] in self.handlers_dict:
+            handler = self.handlers_dict[parsed_path.path[:-len("/search")]]
+            query = parse_qs(parsed_path.query)
+            return self.handle_search_request(handler, query, headers)
+        if parsed_path.path.endswith("/events") and parsed_path.path[:-len("/events")] in self.handlers_dict:
+            handler = self.handlers_dict[parsed_path.path[:-len("/events")]]
+            query = parse_qs(parsed_path.query)
+            return self.handle_events_request(handler, query, headers)
+        if parsed_path.path in self.handlers_dict:
+            handler = self.handlers_dict[parsed_path.path]
+            query = parse_qs(parsed_path.query)
+            return self.handle_get_model_list_request(handler, headers, query)
+        return self.json_response(404, {"error": "Not found"})
+
+    # 处理POST请求
+    def handle_post(self, path, headers, body):
+        parsed_path = urlparse(path)
+        if parsed_path.path.endswith("/detail") and parsed_path.path[:-len("/detail")] in self.handlers_dict:
+            handler = self.handlers_dict[parsed_path.path[:-len("/detail")]]
+            return self.handle_post_request(handler, parse_qs(parsed_path.query), body)
+        if parsed_path.path.endswith("/batch") and parsed_path.path[:-len("/batch")] in self.handlers_dict:
+            handler = self.handlers_dict[parsed_path.path[:-len("/batch")]]
+            return self.handle_batch_request(handler, body)
+        if parsed_path.path == f"{self.base_url}/current_windows/toggle_set_top":
+            handler = self.handlers_dict.get(f"{self.base_url}/current_windows")
+            if handler:
+                return self.handle_toggle_set_top_request(handler, parsed_path.query, body)
+        if parsed_path.path == f"{self.base_url}/current_windows/set_top_all":
+            handler = self.handlers_dict.get(f"{self.base_url}/current_windows")
+            if handler:
+                return self.handle_set_top_all_request(handler, parsed_path.query, body)
+        return self.json_response(404, {"error": "Not found"})
+
+    def handle_get_model_list_request(self, handler, headers=None, query=None):
+        """
+        处理 GET 请求并返回相应的 JSON 数据。
+        带有分页参数（limit、cursor、after_id、order_by、fields）时返回 {"items": [...], "next_cursor": ...}。
+        如果客户端的 If-None-Match 与模型表当前的 ETag 相同，则直接返回 304，不读取模型表。
+
+        :param handler: DataHandler 实例
+        :param headers: 请求头
+        :param query: URL 参数字典
+        """
+        page_query = {k: v[0] for k, v in (query or {}).items() if k in self.page_parameters}
+        # 先取版本号再读数据，读取期间发生的修改只会让 ETag 偏旧，客户端下次请求时会重新获取
+        etag = handler.get_etag(page_query)
+        if self.is_not_modified(headers, etag):
+            return 304, {"ETag": etag}, b""
+        if not page_query:
+            # 逐批读取和序列化，表很大时不会在内存中同时保存所有行、完整的 JSON 字符串和字节串
+            body = self.buffer_or_stream(handler.iter_model_list_json(use_cache=self.allows_cache(headers)))
+            return 200, {"Content-type": "application/json", "ETag": etag}, body
+
+        try:
+            limit = int(page_query["limit"]) if "limit" in page_query else None
+            after_id = int(page_query["after_id"]) if "after_id" in page_query else None
+            if limit is not None and limit <= 0:
+                raise ValueError("limit must be a positive integer")
+            fields = [field.strip() for field in page_query.get("fields", "").split(",") if field.strip()]
+            page_json = handler.get_model_page_json(fields, limit, page_query.get("order_by"),
+                                                    page_query.get("cursor"), after_id)
+        except ValueError as e:
+            return self.json_response(400, {"error": str(e)})
+        return self.json_response(200, page_json, {"ETag": etag})
+
+    def handle_stats_request(self):
+        """
+        处理统计请求，返回当前打开的窗口数、被置顶的窗口数、曾经打开过的窗口数和各个表的统计信息。
+        所有数字由数据库统计，不读取行。
+        """
+        tables = {handler.model.model_name: handler.get_table_stats() for handler in self.handlers_dict.values()}
+        current_windows = tables.get("current_windows", {})
+        all_windows = tables.get("all_windows", {})
+        stats = {
+            "open": current_windows.get("rows"),
+            "pinned": current_windows.get("is_set_top"),
+            "history": all_windows.get("rows"),
+            "tables": tables,
+        }
+        return self.json_response(200, stats)
+
+    def handle_search_request(self, handler, query=None, headers=None):
+        """
+        处理全文搜索请求，查询参数为 q（搜索文本）、limit 和 cursor，返回 {"items": [...], "next_cursor": ...}。
+        如果客户端的 If-None-Match 与当前的 ETag 相同，则直接返回 304。
+
+        :param handler: DataHandler 实例
+        :param query: URL 参数字典
+        :param headers: 请求头
+        """
+        search_query = {k: v[0] for k, v in (query or {}).items() if k in ("q", "limit", "cursor")}
+        etag = handler.get_etag({"search": search_query})
+        if self.is_not_modified(headers, etag):
+            return 304, {"ETag": etag}, b""
+
+        try:
+            limit = int(search_query["limit"]) if "limit" in search_query else None
+            if limit is not None and limit <= 0:
+                raise ValueError("limit must be a positive integer")
+            search_json = handler.search_model_json(search_query.get("q", ""), limit, search_query.get("cursor"))
+        except ValueError as e:
+            return self.json_response(400, {"error": str(e)})
+        return self.json_response(200, search_json, {"ETag": etag})
+
+    def handle_get_model_detail_request(self, handler, query=None, body=b"", headers=None):
+        """
+        处理详细模型查询请求，根据传入的 JSON 数据调用 handler 的 get_model_from_json 方法。
+        如果客户端的 If-None-Match 与当前查询的 ETag 相同，则直接返回 304，不读取模型表。
+
+        :param handler: DataHandler 实例
+        :param query: URL 参数字典
+        :param body: 请求体字节串
+        :param headers: 请求头
+        """
+        query_dict = {}
+
+        if query:
+            query_dict.update({k: v[0].strip('"') for k, v in query.items()})  # 移除多余的引号
+
+        post_data_dict = self.parse_json_body(body)
+        if post_data_dict is None:
+            return self.json_response(400, {"error": "Invalid JSON"})
+        query_dict.update(post_data_dict)
+
+        if not query_dict:
+            return self.json_response(200, {"error": "No data provided"})
+
+        etag = handler.get_etag(query_dict)
+        if self.is_not_modified(headers, etag):
+            return 304, {"ETag": etag}, b""
+        query_json = json.dumps(query_dict)
+        result_json = handler.get_model_from_json(query_json, self.allows_cache(headers))
+        return self.json_response(200, result_json, {"ETag": etag})
+
+    def handle_events_request(self, handler, query=None, headers=None):
+        """
+        处理变更事件流请求，以 Server-Sent Events 的形式持续推送模型表的行级变更事件。
+        客户端重新连接时通过 Last-Event-ID 请求头（或 last_event_id 查询参数）只补收错过的事件。
+
+        :param handler: DataHandler 实例
+        :param query: URL 参数字典
+        :param headers: 请求头
+        """
+        last_event_id = headers.get('Last-Event-ID') if headers is not None else None
+        if not last_event_id and query and "last_event_id" in query:
+            last_event_id = query["last_event_id"][0]
+        subscriber = handler.subscribe_changes(last_event_id)
+        response_headers = {"Content-type": "text/event-stream", "Cache-Control": "no-cache"}
+        return 200, response_headers, EventStreamBody(subscriber)
+
+    def handle_post_request(self, handler, query=None, body=b""):
+        """
+        处理 POST 请求，根据传入的 JSON 数据更新模型表。
+
+        :param handler: DataHandler 实例
+        :param query: URL 参数字典
+        :param body: 请求体字节串
+        """
+        data_dict = {}
+
+        # 处理 URL 查询参数
+        if query:
+            data_dict.update({k: v[0].strip('"') for k, v in query.items()})
+
+        # 处理请求体数据
+        post_data_dict = self.parse_json_body(body)
+        if post_data_dict is None:
+            return self.json_response(400, {"error": "Invalid JSON"})
+        data_dict.update(post_data_dict)
+
+        if not data_dict:
+            return self.json_response(400, {"error": "No data provided"})
+
+        # 更新模型数据
+        json_data = json.dumps(data_dict)
+        condition = 'hwnd' if 'hwnd' in data_dict else 'name' if 'name' in data_dict else None
+        if condition:
+            buffered = handler.update_model_from_json(json_data, condition)
+            # 获取并返回更新后的模型数据，延迟写入时按条件列查询，结果中包括等待写入的笔记
+            query_json = json.dumps({condition: data_dict[condition]}) if buffered else json_data
+            result_json = handler.get_model_from_json(query_json)
+            return self.json_response(200, result_json)
+        return self.json_response(400, {"error": "No valid condition provided"})
+
+    def handle_batch_request(self, handler, body=b""):
+        """
+        处理批量操作请求。请求体为操作数组，或者 {"operations": [...]}，所有操作在一个事务中执行。
+        全部成功时返回 200，任意一个操作失败时所有操作都不会生效，返回 400，结果中标明失败的操作。
+
+        :param handler: DataHandler 实例
+        :param body: 请求体字节串
+        """
+        operations = self.parse_json_body(body)
+        if isinstance(operations, dict):
+            operations = operations.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return self.json_response(400, {"error": "Expected a non-empty array of operations"})
+        try:
+            result = handler.apply_batch(operations)
+        except ValueError as e:
+            return self.json_response(400, {"error": str(e)})
+        return self.json_response(200 if result["committed"] else 400, result)
+
+    def handle_toggle_set_top_request(self, handler, query, body=b""):
+        """
+        处理 POST 请求，根据传入的 JSON 数据切换 is_set_top 字段的值。
+
+        :param handler: DataHandler 实例
+        :param query: URL 查询字符串
+        :param body: 请求体字节串
+        """
+        query_dict = parse_qs(query)
+        data_dict = {k: v[0] for k, v in query_dict.items()}
+
+        post_data_dict = self.parse_json_body(body)
+        if post_data_dict is None:
+            return self.json_response(400, {"error": "Invalid JSON"})
+        data_dict.update(post_data_dict)
+
+        if not data_dict:
+            return self.json_response(400, {"error": "No data provided"})
+
+        condition = 'hwnd' if 'hwnd' in data_dict else 'name' if 'name' in data_dict else None
+        if condition:
+            # 请求中除了条件列还有其他字段时（如同时提供 hwnd 和新的 name）先更新这些字段
+            if any(column != condition for column in data_dict):
+                handler.update_model_from_json(json.dumps(data_dict), condition)
+            # 切换并返回切换后的模型数据
+            result_json = handler.toggle_is_set_top(condition, data_dict[condition])
+            return self.json_response(200, result_json)
+        return self.json_response(400, {"error": "No valid condition provided"})
+
+    def handle_set_top_all_request(self, handler, query, body=b""):
+        """
+        处理 POST 请求，暂停或继续所有窗口的置顶。
+
+        :param handler: DataHandler 实例
+        :param query: URL 查询字符串
+        :param body: 请求体字节串
+        """
+        data_dict = {k: v[0] for k, v in parse_qs(query).items()}
+        post_data_dict = self.parse_json_body(body)
+        if post_data_dict is None:
+            return self.json_response(400, {"error": "Invalid JSON"})
+        data_dict.update(post_data_dict)
+
+        try:
+            result = handler.set_top_all(data_dict.get("action"))
+        except ValueError as e:
+            return self.json_response(400, {"error": str(e)})
+        return self.json_response(200, result)
@@ -1,284 +1,687 @@
-import json
+import selectors
+import socket
 import threading
 import time
-from urllib.parse import parse_qs, urlparse
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from async_server_control import AsyncServerControl
 from data_handler import DataHandler
 from data_models import CurrentWindows, AllWindows
 from database import Database
 from model_control import ModelControl
+from request_router import EventStreamBody, RequestRouter
+from window_enumerator import WindowEnumerator, Win32WindowEnumerator
+
+
+class BoundedThreadPoolHTTPServer(HTTPServer):
+    # 操作系统监听队列的长度，默认的 5 在大量客户端同时连接时会导致连接被重试
+    request_queue_size = 128
+
+    def __init__(self, server_address, request_handler_class, max_workers: int = 16, max_pending: int = 64,
+                 max_event_streams: int = 64, keep_alive_timeout: float = 5.0):
+        """
+        使用有界线程池并发处理请求的 HTTP 服务器。
+        正在处理和排队的请求总数达到上限时，服务器暂停接受新连接，新连接在操作系统的监听队列中等待。
+        事件流（Server-Sent Events）在整个订阅期间占用连接，写出响应头后交给单独的线程，不占用工作线程。
+        持久连接在两个请求之间不占用工作线程：空闲的连接由一个线程通过 selectors 等待，收到下一个请求时才交给工作线程，
+        空闲超过 keep_alive_timeout 秒时关闭。
+
+        :param server_address: (主机地址, 端口号)
+        :param request_handler_class: 请求处理程序类
+        :param max_workers: 工作线程数，每个工作线程复用自己的数据库连接
+        :param max_pending: 等待工作线程处理的最大请求数
+        :param max_event_streams: 同时进行的事件流的最大数量，超出时新的订阅请求返回 503
+        :param keep_alive_timeout: 持久连接的空闲超时时间（秒）
+        """
+        super().__init__(server_address, request_handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="SetWindowsTopAPI")
+        self.request_slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.stream_slots = threading.BoundedSemaphore(max_event_streams)
+        # 交给单独线程的事件流连接，工作线程返回后不关闭
+        self.detached_requests = set()
+        self.detached_lock = threading.Lock()
+
+        # 等待下一个请求的空闲连接：新加入的处理程序先放入 parking_queue，由等待线程注册到 selector
+        self.keep_alive_timeout = keep_alive_timeout
+        self.selector = selectors.DefaultSelector()
+        self.parking_queue = []
+        self.parking_lock = threading.Lock()
+        self.parking_closed = False
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        self.keep_alive_thread = threading.Thread(target=self.run_keep_alive, name="SetWindowsTopAPI-keep-alive",
+                                                  daemon=True)
+        self.keep_alive_thread.start()
+
+    def process_request(self, request, client_address):
+        """
+        将请求交给工作线程处理。
+        """
+        self.request_slots.acquire()
+        try:
+            self.executor.submit(self.process_request_worker, request, client_address)
+        except RuntimeError:
+            # 线程池已关闭，直接丢弃该连接
+            self.request_slots.release()
+            self.shutdown_request(request)
+
+    def process_request_worker(self, request, client_address):
+        """
+        在工作线程中处理请求。
+        """
+        handler = None
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.end_request(request, handler)
+
+    def finish_request(self, request, client_address):
+        """
+        创建请求处理程序处理连接。
+
+        :return: 请求处理程序实例
+        """
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def park_request(self, handler):
+        """
+        把处理完请求的持久连接交给等待线程，连接可读时再由工作线程继续处理。
+
+        :param handler: 请求处理程序实例
+        :return: 连接被接管时返回 True，服务器正在关闭时返回 False，此时由调用者关闭连接
+        """
+        with self.parking_lock:
+            if self.parking_closed:
+                return False
+            self.parking_queue.append(handler)
+        self.wake_keep_alive()
+        return True
+
+    def wake_keep_alive(self):
+        """
+        唤醒等待线程，使其处理新加入的连接或者结束运行。
+        """
+        try:
+            self.wakeup_writer.send(b"\0")
+        except OSError:
+            pass
+
+    def run_keep_alive(self):
+        """
+        等待线程：等待空闲连接可读或超时。可读（包括客户端关闭连接）时交给工作线程，超时时关闭连接。
+        """
+        deadlines = {}
+        while True:
+            timeout = max(0.0, min(deadlines.values()) - time.monotonic()) if deadlines else None
+            events = self.selector.select(timeout)
+            with self.parking_lock:
+                parked, self.parking_queue = self.parking_queue, []
+                closed = self.parking_closed
+            for handler in parked:
+                self.selector.register(handler.request, selectors.EVENT_READ, handler)
+                deadlines[handler] = time.monotonic() + self.keep_alive_timeout
+
+            ready = []
+            for key, _ in events:
+                if key.fileobj is self.wakeup_reader:
+                    try:
+                        while self.wakeup_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif key.data in deadlines:
+                    ready.append(key.data)
+            now = time.monotonic()
+            expired = [handler for handler, deadline in deadlines.items()
+                       if handler not in ready and (closed or deadline <= now)]
+            for handler in ready + expired:
+                del deadlines[handler]
+                self.selector.unregister(handler.request)
+
+            for handler in expired:
+                self.close_handler(handler)
+            for handler in ready:
+                self.request_slots.acquire()
+                try:
+                    self.executor.submit(self.resume_request_worker, handler)
+                except RuntimeError:
+                    self.request_slots.release()
+                    self.close_handler(handler)
+            if closed:
+                return
+
+    def resume_request_worker(self, handler):
+        """
+        在工作线程中继续处理持久连接上的下一个请求。
+        """
+        try:
+            handler.resume()
+        except Exception:
+            handler.parked = False
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            if not handler.parked:
+                try:
+                    handler.finish()
+                except OSError:
+                    pass
+            self.end_request(handler.request, handler)
+
+    def end_request(self, request, handler=None):
+        """
+        工作线程处理完连接后调用：连接仍然保持时交给等待线程，交给单独线程的事件流由该线程关闭，其他连接直接关闭。
+        处理程序在这之后不再被当前工作线程使用，因此可以被等待线程交给另一个工作线程。
+
+        :param request: 连接的套接字
+        :param handler: 请求处理程序实例，创建失败时为 None
+        """
+        try:
+            if getattr(handler, "parked", False):
+                if not self.park_request(handler):
+                    handler.parked = False
+                    self.close_handler(handler)
+                return
+            with self.detached_lock:
+                detached = request in self.detached_requests
+            if not detached:
+                self.shutdown_request(request)
+        finally:
+            self.request_slots.release()
+
+    def close_handler(self, handler):
+        """
+        结束请求处理程序并关闭连接。
+        """
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def reserve_stream(self):
+        """
+        为一个事件流占用名额，之后必须调用 detach_request 或 release_stream。
+
+        :return: 占用成功返回 True，事件流已达到 max_event_streams 时返回 False
+        """
+        return self.stream_slots.acquire(blocking=False)
+
+    def release_stream(self):
+        """
+        释放 reserve_stream 占用的名额。
+        """
+        self.stream_slots.release()
+
+    def detach_request(self, request, target):
+        """
+        把连接交给单独的线程继续处理，工作线程返回后不关闭该连接。target 结束后关闭连接并释放事件流的名额。
+
+        :param request: 连接的套接字
+        :param target: 在单独的线程中执行的无参数函数
+        """
+        with self.detached_lock:
+            self.detached_requests.add(request)
+
+        def run():
+            try:
+                target()
+            finally:
+                with self.detached_lock:
+                    self.detached_requests.discard(request)
+                self.shutdown_request(request)
+                self.release_stream()
+
+        threading.Thread(target=run, name="SetWindowsTopAPI-stream", daemon=True).start()
+
+    def server_close(self):
+        """
+        关闭服务器，关闭所有空闲的持久连接，并等待所有已接受的请求处理完成。
+        """
+        super().server_close()
+        with self.parking_lock:
+            self.parking_closed = True
+        self.wake_keep_alive()
+        self.keep_alive_thread.join()
+        self.executor.shutdown(wait=True)
+        self.selector.close()
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
 
 
 class ServerControl:
-    def __init__(self, handlers: List[DataHandler], host: str = '127.0.0.1', port: int = 8212):
+    def __init__(self, handlers: List[DataHandler], host: str = '127.0.0.1', port: int = 8212,
+                 mode: str = "threaded", max_workers: int = 16, keep_alive_timeout: float = 5.0,
+                 max_keep_alive_requests: int = 100):
         """
         初始化 ServerControl 实例。
 
         :param handlers: 包含多个 DataHandler 的列表
         :param host: 主机地址，默认为 '127.0.0.1'
         :param port: 端口号，默认为 8212
+        :param mode: 服务模式，threaded 使用有界线程池并发处理请求，single 逐个处理请求，
+                     asyncio 使用非阻塞套接字处理请求，数据库操作在专用线程池中执行
+        :param max_workers: threaded 模式下的工作线程数或 asyncio 模式下数据库线程池的线程数，默认为 16
+        :param keep_alive_timeout: 持久连接的空闲超时时间（秒），超时后服务器关闭该连接，默认为 5
+        :param max_keep_alive_requests: 每个持久连接最多处理的请求数，达到后服务器关闭该连接，默认为 100
         """
         self.handlers = handlers
         self.host = host
         self.port = port
+        self.mode = mode
+        self.max_workers = max_workers
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.router = RequestRouter(handlers)
+        self.httpd = None
+        self.async_server = None
 
     def start_server(self):
         """
         启动服务器。
         """
+        if self.mode == "asyncio":
+            self.async_server = AsyncServerControl(self.router, self.host, self.port, max_workers=self.max_workers,
+                                                   idle_timeout=self.keep_alive_timeout,
+                                                   max_keep_alive_requests=self.max_keep_alive_requests)
+            self.async_server.start_server()
+            return
+
         server_address = (self.host, self.port)
-        httpd = HTTPServer(server_address, self.RequestHandlerFactory())
+        if self.mode == "threaded":
+            self.httpd = BoundedThreadPoolHTTPServer(server_address, self.RequestHandlerFactory(),
+                                                     max_workers=self.max_workers,
+                                                     keep_alive_timeout=self.keep_alive_timeout)
+        else:
+            # 逐个处理请求时，保持的空闲连接会阻塞其他客户端，因此每个请求后都关闭连接
+            self.httpd = HTTPServer(server_address, self.RequestHandlerFactory(keep_alive=False))
         print(f"Starting server at http://{self.host}:{self.port}")
-        httpd.serve_forever()
+        self.httpd.serve_forever()
 
-    def RequestHandlerFactory(self):
+    def stop_server(self):
+        """
+        停止服务器。不再接受新的请求，并等待已接受的请求处理完成后关闭。
+        """
+        self.router.close_streams()
+        if self.async_server is not None:
+            self.async_server.stop_server()
+            self.async_server = None
+        if self.httpd is None:
+            return
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd = None
+        self.router.close_handlers()
+
+    def RequestHandlerFactory(self, keep_alive: bool = True):
         """
         创建一个请求处理程序类，根据请求的路径返回相应的 DataHandler 的 JSON 数据。
+        处理程序使用 HTTP/1.1，每个响应都带有 Content-Length，客户端可以复用同一个连接发送多个请求。
+
+        :param keep_alive: 是否允许持久连接
         """
-        handlers_dict = {f"/SetWindowsTopAPI{handler.url}": handler for handler in self.handlers}
+        router = self.router
+        keep_alive_timeout = self.keep_alive_timeout
+        max_keep_alive_requests = self.max_keep_alive_requests if keep_alive else 1
 
         class CustomHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头和响应体分两次写出，持久连接上需要关闭 Nagle 算法，否则每个请求都会等待延迟确认
+            disable_nagle_algorithm = True
+            # 连接的空闲超时时间，超时后 handle_one_request 结束并关闭连接
+            timeout = keep_alive_timeout
+
+            def setup(self):
+                super().setup()
+                self.handled_requests = 0
+                self.parked = False
+
+            def handle(self):
+                """
+                处理连接上的请求。线程池服务器中每次只处理已经到达的请求，之后把空闲连接交给服务器等待，不占用工作线程。
+                """
+                if not hasattr(self.server, "park_request"):
+                    super().handle()
+                    return
+                self.close_connection = True
+                self.handle_available_requests()
+
+            def resume(self):
+                """
+                空闲连接可读时由服务器的工作线程调用，继续处理下一个请求。
+                """
+                self.parked = False
+                self.handle_available_requests()
+
+            def handle_available_requests(self):
+                """
+                处理一个请求以及客户端已经发送的后续请求，之后连接仍然保持时交给服务器等待。
+                """
+                self.handle_one_request()
+                while not self.close_connection and self.has_buffered_request():
+                    self.handle_one_request()
+                # 工作线程返回后由服务器交给等待线程
+                self.parked = not self.close_connection
+
+            def has_buffered_request(self):
+                """
+                判断客户端是否已经发送了下一个请求（例如管线化的请求），不阻塞。
+                读取缓冲区中的数据不会使套接字可读，因此这些请求需要直接处理。
+
+                :return: 有可以读取的数据时返回 True
+                """
+                self.connection.settimeout(0)
+                try:
+                    return bool(self.rfile.peek(1))
+                except OSError:
+                    self.close_connection = True
+                    return False
+                finally:
+                    self.connection.settimeout(self.timeout)
+
+            def finish(self):
+                # 等待下一个请求的连接由服务器在之后关闭
+                if not self.parked:
+                    super().finish()
+
             # 处理GET请求
             def do_GET(self):
-                parsed_path = urlparse(self.path)
-                if parsed_path.path == "/SetWindowsTopAPI":
-                    self.send_response(200)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    welcome_info = {
-                        "message": "Welcome to WindowsSetTopAPI",
-                        "API instructions url": "https://github.com/YDDLJW/BJ12SetWindowsTop/blob/main/API%E4%BD%BF"
-                                                "%E7%94"
-                                                "%A8%26%E5%BC%80%E5%8F%91%E6%8C%87%E5%8D%97.md#%E8%8E%B7%E5%8F%96%E7%89"
-                                                "%B9%E5%AE%9A%E5%BD%93%E5%89%8D%E7%AA%97%E5%8F%A3%E4%BF%A1%E6%81%AF",
-                        "GET all current windows list": "/SetWindowsTopAPI/current_windows",
-                        "GET all past windows list": "/SetWindowsTopAPI/all_windows",
-                        "GET or POST(update) certain current windows": "/SetWindowsTopAPI/current_windows/detail",
-                        "GET or POST(update) certain past windows": "/SetWindowsTopAPI/all_windows/detail",
-                        "POST(toggle) a current window's status of is_set_top": "/SetWindowsTopAPI/current_windows"
-                                                                                "/toggle_set_top",
-                    }
-                    self.wfile.write(json.dumps(welcome_info).encode())
-                elif parsed_path.path.endswith("/detail") and parsed_path.path.rstrip("/detail") in handlers_dict:
-                    base_path = parsed_path.path.rstrip("/detail")
-                    handler = handlers_dict[base_path]
-                    query = parse_qs(parsed_path.query)
-                    self.handle_get_model_detail_request(handler, query)
-                elif parsed_path.path in handlers_dict:
-                    handler = handlers_dict[parsed_path.path]
-                    self.handle_get_model_list_request(handler)
-                else:
-                    self.send_response(404)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Not found"}).encode())
+                self.handle_routed_request("GET")
 
             # 处理POST请求
             def do_POST(self):
-                parsed_path = urlparse(self.path)
-                if any(parsed_path.path.startswith(f"{key}/detail") for key in handlers_dict.keys()):
-                    base_path = parsed_path.path.split("/detail")[0]
-                    handler = handlers_dict.get(base_path)
-                    if handler:
-                        self.handle_post_request(handler)
-                elif parsed_path.path == "/SetWindowsTopAPI/current_windows/toggle_set_top":
-                    handler = handlers_dict.get("/SetWindowsTopAPI/current_windows")
-                    if handler:
-                        self.handle_toggle_set_top_request(handler, parsed_path.query)
-                else:
-                    self.send_response(404)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Not found"}).encode())
+                self.handle_routed_request("POST")
 
-            def handle_get_model_list_request(self, handler):
+            def handle_routed_request(self, method):
                 """
-                处理 GET 请求并返回相应的 JSON 数据。
+                读取请求体，交给 RequestRouter 处理，并写回响应。
 
-                :param handler: DataHandler 实例
+                :param method: 请求方法
                 """
-                self.send_response(200)
-                self.send_header("Content-type", "application/json")
-                self.end_headers()
-                self.wfile.write(handler.get_model_list_json().encode())
+                content_length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(content_length) if content_length > 0 else b""
+                status, headers, response_body = router.handle_request(method, self.path, self.headers, body)
+
+                # 线程池服务器把事件流交给单独的线程，事件流过多时拒绝新的订阅
+                detach = isinstance(response_body, EventStreamBody) and hasattr(self.server, "reserve_stream")
+                if detach and not self.server.reserve_stream():
+                    response_body.close()
+                    detach = False
+                    status, headers, response_body = router.json_response(503, {"error": "Too many event streams"})
+
+                # 达到单个连接的最大请求数后关闭连接
+                self.handled_requests += 1
+                if self.handled_requests >= max_keep_alive_requests:
+                    self.close_connection = True
+
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                if isinstance(response_body, bytes):
+                    self.send_header("Content-Length", str(len(response_body)))
+                    self.send_header("Connection", "close" if self.close_connection else "keep-alive")
+                    self.end_headers()
+                    self.wfile.write(response_body)
+                else:
+                    self.send_streaming_body(response_body, detach)
 
-            def handle_get_model_detail_request(self, handler, query=None):
+            def send_streaming_body(self, response_body, detach=False):
                 """
-                处理详细模型查询请求，根据传入的 JSON 数据调用 handler 的 get_model_from_json 方法。
+                使用分块传输编码逐段写出流式响应体。客户端断开时结束响应并关闭连接。
 
-                :param handler: DataHandler 实例
-                :param query: URL 参数字典
+                :param response_body: 逐段产生字节串的可迭代对象
+                :param detach: 是否在写出响应头后把连接交给服务器的单独线程写出响应体，需要先调用 reserve_stream
+                """
+                if detach or not getattr(response_body, "keep_alive", True):
+                    self.close_connection = True
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Connection", "close" if self.close_connection else "keep-alive")
+                detached = False
+                try:
+                    self.end_headers()
+                    if detach:
+                        self.server.detach_request(self.request, lambda: self.write_chunks(response_body))
+                        detached = True
+                    else:
+                        self.write_chunks(response_body)
+                finally:
+                    if detach and not detached:
+                        self.server.release_stream()
+                        response_body.close()
+
+            def write_chunks(self, response_body):
                 """
-                query_dict = {}
+                逐段写出分块传输编码的响应体，直接写入套接字，工作线程结束请求后仍然可以使用。
 
-                if query:
-                    query_dict.update({k: v[0].strip('"') for k, v in query.items()})  # 移除多余的引号
+                :param response_body: 逐段产生字节串的可迭代对象
+                """
+                try:
+                    for chunk in response_body:
+                        if chunk:
+                            self.connection.sendall(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.connection.sendall(b"0\r\n\r\n")
+                except OSError:
+                    self.close_connection = True
+                finally:
+                    if hasattr(response_body, "close"):
+                        response_body.close()
 
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 0:
-                    post_data = self.rfile.read(content_length).decode('utf-8')
-                    try:
-                        post_data_dict = json.loads(post_data)
-                        query_dict.update(post_data_dict)
-                    except json.JSONDecodeError:
-                        self.send_response(400)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Invalid JSON"}).encode())
-                        return
-
-                if query_dict:
-                    query_json = json.dumps(query_dict)
-                    result_json = handler.get_model_from_json(query_json)
-                else:
-                    result_json = json.dumps({"error": "No data provided"})
+        return CustomHandler
 
-                self.send_response(200)
-                self.send_header("Content-type", "application/json")
-                self.end_headers()
-                self.wfile.write(result_json.encode())
 
-            def handle_post_request(self, handler):
-                """
-                处理 POST 请求，根据传入的 JSON 数据更新模型表。
+class BackendSelfControl:
+    def __init__(self, current_windows: CurrentWindows, all_windows: AllWindows, debounce: float = 0.2,
+                 max_latency: float = 2.0):
+        """
+        初始化后端自动控制程序。
+        该程序不再循环轮询数据库，而是等待 DataModel 的变更通知，只有 notes 确实发生变化时才执行同步。
 
-                :param handler: DataHandler 实例
-                """
-                parsed_path = urlparse(self.path)
-                query = parse_qs(parsed_path.query)
-                data_dict = {}
+        :param current_windows: 当前窗口模型数据库表格
+        :param all_windows: 所有窗口模型数据库表格
+        :param debounce: 收到变更后继续等待的静默时间（秒），期间的连续变更会合并为一次同步
+        :param max_latency: 从第一次变更到执行同步的最长等待时间（秒），防止持续写入时同步被无限推迟
+        """
+        self.current_windows = current_windows
+        self.all_windows = all_windows
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.change_notifier = current_windows.change_notifier
+        self.model_control = ModelControl(current_windows, all_windows)
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # 运行统计
+        self.started_at = None
+        self.wakeups = 0
+        self.runs = 0
+        self.last_run_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def get_notes_versions(self):
+        """
+        获取两个表中 notes 列最后一次变化时的版本号。
 
-                # 处理 URL 查询参数
-                if query:
-                    data_dict.update({k: v[0].strip('"') for k, v in query.items()})
+        :return: (current_windows 的版本号, all_windows 的版本号)
+        """
+        return (self.change_notifier.get_column_version(self.current_windows.model_name, "notes"),
+                self.change_notifier.get_column_version(self.all_windows.model_name, "notes"))
 
-                # 处理请求体数据
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 0:
-                    post_data = self.rfile.read(content_length).decode('utf-8')
-                    try:
-                        post_data_dict = json.loads(post_data)
-                        data_dict.update(post_data_dict)
-                    except json.JSONDecodeError:
-                        self.send_response(400)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Invalid JSON"}).encode())
-                        return
-
-                if not data_dict:
-                    self.send_response(400)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "No data provided"}).encode())
-                    return
+    def wait_for_change(self, last_version, timeout=None):
+        """
+        等待数据变化，并记录唤醒次数。
 
-                # 更新模型数据
-                json_data = json.dumps(data_dict)
-                condition = 'hwnd' if 'hwnd' in data_dict else 'name' if 'name' in data_dict else None
-                if condition:
-                    handler.update_model_from_json(json_data, condition)
-                    # 获取并返回更新后的模型数据
-                    result_json = handler.get_model_from_json(json_data)
-                    self.send_response(200)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(result_json.encode())
-                else:
-                    self.send_response(400)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "No valid condition provided"}).encode())
+        :param last_version: 已经处理过的版本号
+        :param timeout: 最长等待时间（秒）
+        :return: 当前的全局版本号
+        """
+        version = self.change_notifier.wait_for_change(last_version, timeout)
+        self.wakeups += 1
+        return version
 
-            def handle_toggle_set_top_request(self, handler, query):
-                """
-                处理 POST 请求，根据传入的 JSON 数据切换 is_set_top 字段的值。
+    def sync_notes(self):
+        """
+        以 all_windows 的值为标准，统一 current_windows 和 all_windows 中 id 和 name 参数的值相同的模型中的 notes 参数的值，
+        并记录本次执行耗时。
+        """
+        start_time = time.perf_counter()
+        self.model_control.unified_key('notes', 'id', 'name')
+        self.last_run_seconds = time.perf_counter() - start_time
+        self.total_run_seconds += self.last_run_seconds
+        self.runs += 1
 
-                :param handler: DataHandler 实例
-                :param query: URL 参数字典
-                """
-                query_dict = parse_qs(query)
-                data_dict = {k: v[0] for k, v in query_dict.items()}
+    def run(self):
+        """
+        运行后端自动控制程序，直到调用 stop。启动时先同步一次。
+        """
+        self.started_at = time.monotonic()
+        last_version = self.change_notifier.version
+        notes_versions = self.get_notes_versions()
+        self.sync_notes()
+
+        while not self.stopped.is_set():
+            version = self.wait_for_change(last_version)
+            if self.stopped.is_set():
+                break
+            if version == last_version:
+                continue
+
+            # 合并连续的变更：静默 debounce 秒或者距第一次变更超过 max_latency 秒后再执行同步
+            first_change_time = time.monotonic()
+            while self.debounce > 0 and not self.stopped.is_set():
+                remaining = min(self.debounce, self.max_latency - (time.monotonic() - first_change_time))
+                if remaining <= 0:
+                    break
+                new_version = self.wait_for_change(version, remaining)
+                if new_version == version:
+                    break
+                version = new_version
+            last_version = version
+
+            # 只有 notes 发生变化（包括添加或删除行）时才执行同步
+            new_notes_versions = self.get_notes_versions()
+            if new_notes_versions != notes_versions:
+                notes_versions = new_notes_versions
+                self.sync_notes()
+
+    def start(self):
+        """
+        在单独的线程中运行后端自动控制程序。
 
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 0:
-                    post_data = self.rfile.read(content_length).decode('utf-8')
-                    try:
-                        post_data_dict = json.loads(post_data)
-                        data_dict.update(post_data_dict)
-                    except json.JSONDecodeError:
-                        self.send_response(400)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Invalid JSON"}).encode())
-                        return
-
-                if not data_dict:
-                    self.send_response(400)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "No data provided"}).encode())
-                    return
+        :return: self
+        """
+        self.thread = threading.Thread(target=self.run, name="SetWindowsTopAPI-backend")
+        self.thread.start()
+        return self
 
-                # 更新模型数据
-                json_data = json.dumps(data_dict)
-                condition = 'hwnd' if 'hwnd' in data_dict else 'name' if 'name' in data_dict else None
-                if condition:
-                    handler.update_model_from_json(json_data, condition)
-                    # 获取并返回更新后的模型数据
-                    result_json = handler.toggle_is_set_top(condition, data_dict[condition])
-                    self.send_response(200)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps(result_json, ensure_ascii=False, indent=4).encode())
-                else:
-                    self.send_response(400)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "No valid condition provided"}).encode())
+    def stop(self):
+        """
+        停止后端自动控制程序，由 start 启动时等待线程结束。
+        """
+        self.stopped.set()
+        self.change_notifier.wake()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
 
-        return CustomHandler
+    def get_stats(self):
+        """
+        获取运行统计。
 
+        :return: 包含唤醒次数、每秒唤醒次数、同步次数和同步耗时的字典
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        return {
+            "wakeups": self.wakeups,
+            "wakeups_per_second": self.wakeups / elapsed if elapsed > 0 else 0.0,
+            "runs": self.runs,
+            "last_run_seconds": self.last_run_seconds,
+            "average_run_seconds": self.total_run_seconds / self.runs if self.runs else 0.0,
+        }
 
-def backend_self_control(current_windows: CurrentWindows, all_windows: AllWindows):
-    """
-    后端自动控制程序，在后端进行操作的程序都应该在这里执行。
 
-    :param current_windows: 当前窗口模型数据库表格
-    :param all_windows:  所有窗口模型数据库表格
-    """
+class WindowScanner:
+    def __init__(self, current_windows: CurrentWindows, all_windows: AllWindows, enumerator: WindowEnumerator,
+                 interval: float = 0.1):
+        """
+        初始化窗口扫描程序，定期枚举当前打开的窗口，并把与上次扫描的差异同步到 current_windows 和 all_windows。
 
-    # 需要循环执行的程序都应该在这里执行
-    while True:
-        # # 该方法内的程序每2s执行一次
-        # time.sleep(2)
+        :param current_windows: 当前窗口模型数据库表格
+        :param all_windows: 所有窗口模型数据库表格
+        :param enumerator: 窗口枚举器
+        :param interval: 两次扫描开始之间的间隔（秒）
+        """
+        self.current_windows = current_windows
+        self.all_windows = all_windows
+        self.enumerator = enumerator
+        self.interval = interval
+        self.stopped = threading.Event()
+
+        # 运行统计
+        self.scans = 0
+        self.changed_scans = 0
+        self.last_scan_seconds = 0.0
+        self.total_scan_seconds = 0.0
+        self.max_scan_seconds = 0.0
+
+    def scan(self):
+        """
+        执行一次扫描，并记录本次执行耗时。
+
+        :return: sync_snapshot 返回的字典
+        """
+        start_time = time.perf_counter()
+        counts = self.current_windows.sync_snapshot(self.enumerator.enumerate_windows(), self.all_windows)
+        self.last_scan_seconds = time.perf_counter() - start_time
+        self.total_scan_seconds += self.last_scan_seconds
+        self.max_scan_seconds = max(self.max_scan_seconds, self.last_scan_seconds)
+        self.scans += 1
+        if any(counts.values()):
+            self.changed_scans += 1
+        return counts
+
+    def run(self):
+        """
+        运行窗口扫描程序，直到调用 stop。
+        """
+        next_scan_time = time.monotonic()
+        while not self.stopped.is_set():
+            self.scan()
+            # 按固定节奏扫描，单次扫描超时时不补扫
+            next_scan_time = max(next_scan_time + self.interval, time.monotonic())
+            self.stopped.wait(next_scan_time - time.monotonic())
+
+    def stop(self):
+        """
+        停止窗口扫描程序。
+        """
+        self.stopped.set()
 
-        # 实例化模型控制器
-        model_control = ModelControl(current_windows, all_windows)
+    def get_stats(self):
+        """
+        获取运行统计。
 
-        # 获取 current_windows 和 all_windows 表中的所有模型（行）
-        current_windows_rows = current_windows.get_model_list()
-        all_windows_rows = all_windows.get_model_list()
+        :return: 包含扫描次数、有变化的扫描次数和扫描耗时的字典
+        """
+        return {
+            "scans": self.scans,
+            "changed_scans": self.changed_scans,
+            "last_scan_seconds": self.last_scan_seconds,
+            "average_scan_seconds": self.total_scan_seconds / self.scans if self.scans else 0.0,
+            "max_scan_seconds": self.max_scan_seconds,
+        }
 
-        # 将结果统一为列表形式，以便处理
-        if isinstance(current_windows_rows, dict):
-            current_windows_rows = [current_windows_rows]
-        if isinstance(all_windows_rows, dict):
-            all_windows_rows = [all_windows_rows]
 
-        # 构建一个 all_windows 表的字典，便于快速查找
-        all_windows_dict = {(row['id'], row['name']): row for row in all_windows_rows if 'id' in row and 'name' in row}
+def backend_self_control(current_windows: CurrentWindows, all_windows: AllWindows) -> BackendSelfControl:
+    """
+    后端自动控制程序，在后端进行操作的程序都应该在这里执行。程序在单独的线程中运行，本函数立即返回。
 
-        # 当检测到current_windows和all_windows中id和name参数值相同的模型中的notes变化时，统一两者的notes参数的值
-        for current_row in current_windows_rows:
-            if 'id' in current_row and 'name' in current_row:
-                key = (current_row['id'], current_row['name'])
-                if key in all_windows_dict:
-                    all_row = all_windows_dict[key]
-                    if current_row['notes'] != all_row['notes']:
-                        # 以all_windows的值为标准，统一current_windows和all_windows中id和name参数的值相同的模型中的notes参数的值
-                        model_control.unified_key('notes', 'id', 'name')
+    :param current_windows: 当前窗口模型数据库表格
+    :param all_windows:  所有窗口模型数据库表格
+    :return: BackendSelfControl 实例，通过 get_stats 获取运行统计，调用 stop 停止
+    """
+    return BackendSelfControl(current_windows, all_windows).start()
 
 
 if __name__ == '__main__':
@@ -313,9 +716,9 @@ if __name__ == '__main__':
     current_windows.add_model_row(row_data)
     all_windows.add_model_row(row_data)
 
-    # 创建 DataHandler 实例
-    current_windows_handler = DataHandler(current_windows)
-    all_windows_handler = DataHandler(all_windows)
+    # 创建 DataHandler 实例，前端文本框频繁提交的笔记延迟合并写入
+    current_windows_handler = DataHandler(current_windows, write_behind=True)
+    all_windows_handler = DataHandler(all_windows, write_behind=True)
 
     # 创建 ServerControl 实例
     server = ServerControl([current_windows_handler, all_windows_handler])
@@ -325,8 +728,26 @@ if __name__ == '__main__':
     thread_server.start()
 
     # 启动后端自动控制
-    thread_control = threading.Thread(target=backend_self_control, args=(current_windows, all_windows))
-    thread_control.start()
-
-    thread_server.join()
-    thread_control.join()
+    backend_control = backend_self_control(current_windows, all_windows)
+
+    # 在 Windows 上定期扫描当前打开的窗口
+    scanner = None
+    if Win32WindowEnumerator.is_available():
+        scanner = WindowScanner(current_windows, all_windows, Win32WindowEnumerator())
+        thread_scanner = threading.Thread(target=scanner.run, daemon=True)
+        thread_scanner.start()
+
+    # 按 Ctrl+C 停止服务器和后台程序，并输出运行统计
+    try:
+        while thread_server.is_alive():
+            thread_server.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop_server()
+        thread_server.join()
+        if scanner is not None:
+            scanner.stop()
+            print(f"Window scanner stats: {scanner.get_stats()}")
+        backend_control.stop()
+        print(f"Backend self control stats: {backend_control.get_stats()}")
@@ -0,0 +1,128 @@
+import sys
+import threading
+
+
+class WindowEnumerator:
+    def enumerate_windows(self):
+        """
+        枚举当前打开的所有窗口。子类需要重写该方法。
+
+        :return: 窗口字典列表，每个字典包含 hwnd（字符串）和 name
+        """
+        raise NotImplementedError
+
+
+class Win32WindowEnumerator(WindowEnumerator):
+    def __init__(self):
+        """
+        初始化 Win32WindowEnumerator 实例，通过 user32.EnumWindows 枚举可见且有标题的顶层窗口，只能在 Windows 上使用。
+        """
+        import ctypes
+        from ctypes import wintypes
+
+        self.ctypes = ctypes
+        self.user32 = ctypes.windll.user32
+        self.callback_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+
+    @staticmethod
+    def is_available():
+        """
+        检查当前系统是否可以使用该枚举器。
+
+        :return: 在 Windows 上返回 True
+        """
+        return sys.platform == "win32"
+
+    def enumerate_windows(self):
+        """
+        枚举当前可见且有标题的顶层窗口。
+
+        :return: 窗口字典列表，每个字典包含 hwnd（字符串）和 name
+        """
+        windows = []
+
+        def callback(hwnd, _):
+            if self.user32.IsWindowVisible(hwnd):
+                length = self.user32.GetWindowTextLengthW(hwnd)
+                if length > 0:
+                    buffer = self.ctypes.create_unicode_buffer(length + 1)
+                    self.user32.GetWindowTextW(hwnd, buffer, length + 1)
+                    windows.append({"hwnd": str(hwnd), "name": buffer.value})
+            return True
+
+        self.user32.EnumWindows(self.callback_type(callback), 0)
+        return windows
+
+
+class FakeWindowEnumerator(WindowEnumerator):
+    def __init__(self, windows=None):
+        """
+        初始化 FakeWindowEnumerator 实例，返回在内存中模拟的窗口列表，用于测试和性能测试。
+
+        :param windows: 初始的窗口字典列表，每个字典包含 hwnd 和 name
+        """
+        self.lock = threading.Lock()
+        self.windows = {str(window["hwnd"]): window["name"] for window in windows or ()}
+
+    def open_window(self, hwnd, name):
+        """
+        模拟打开一个窗口。
+
+        :param hwnd: 窗口句柄
+        :param name: 窗口标题
+        """
+        with self.lock:
+            self.windows[str(hwnd)] = name
+
+    def close_window(self, hwnd):
+        """
+        模拟关闭一个窗口。
+
+        :param hwnd: 窗口句柄
+        """
+        with self.lock:
+            self.windows.pop(str(hwnd), None)
+
+    def rename_window(self, hwnd, name):
+        """
+        模拟修改窗口标题，窗口不存在时不做任何操作。
+
+        :param hwnd: 窗口句柄
+        :param name: 新的窗口标题
+        """
+        with self.lock:
+            if str(hwnd) in self.windows:
+                self.windows[str(hwnd)] = name
+
+    def enumerate_windows(self):
+        """
+        获取当前模拟的所有窗口。
+
+        :return: 窗口字典列表，每个字典包含 hwnd 和 name
+        """
+        with self.lock:
+            return [{"hwnd": hwnd, "name": name} for hwnd, name in self.windows.items()]
+
+
+if __name__ == '__main__':
+    from data_models import CurrentWindows, AllWindows
+
+    current_windows = CurrentWindows()
+    current_windows.create_model_table()
+    current_windows.delete_all_rows()
+    all_windows = AllWindows()
+    all_windows.create_model_table()
+
+    enumerator = FakeWindowEnumerator([
+        {"hwnd": "123456", "name": "test - window1"},
+        {"hwnd": "1234", "name": "window2"},
+    ])
+    print(current_windows.sync_snapshot(enumerator.enumerate_windows(), all_windows))
+
+    current_windows.update_model_row({"is_set_top": True}, {"hwnd": "1234"})
+    enumerator.rename_window("1234", "window2 renamed")
+    enumerator.close_window("123456")
+    enumerator.open_window("42", "window3")
+    print(current_windows.sync_snapshot(enumerator.enumerate_windows(), all_windows))
+    print(current_windows.get_model_list())
+    print(all_windows.get_model_list())